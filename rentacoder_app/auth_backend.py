@@ -1,5 +1,7 @@
+from functools import partial
+
 from django.contrib.auth.backends import ModelBackend
-from rentacoder_app.models import ProjectScore
+from rentacoder_app.models import User, ProjectScore
 
 
 class UserModelBackend(ModelBackend):
@@ -7,13 +9,20 @@ class UserModelBackend(ModelBackend):
         user = super().authenticate(request, username, password, **kwargs)
         return user if user and not user.deleted else None
 
+    def get_user(self, user_id):
+        # served from a short lived cache, django still compares the session hash with the
+        # password hash of the returned user so a password change ends the other sessions
+        user = User.get_cached_user(user_id)
+        return user if user and self.user_can_authenticate(user) and not user.deleted else None
+
 
 def processor(request):
     if request.user.is_authenticated():
         return {
             'authenticated': True,
             'user': request.user,
-            'num_pending_scores': ProjectScore.get_num_pending_scores_for_user(request.user),
+            # callable so it is only resolved by templates that show the badge
+            'num_pending_scores': partial(ProjectScore.get_cached_num_pending_scores_for_user, request.user),
         }
     else:
         return {
@@ -0,0 +1,75 @@
+import logging
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+import rentacoder_app.constants as const
+
+log = logging.getLogger(__name__)
+
+VARIANTS_FOLDER = 'thumbnails'
+
+
+def variant_name(name, size):
+    """
+    Gets the storage name of a variant of an avatar
+    :param str name: Storage name of the original avatar
+    :param int size: Side of the variant in pixels
+    :return str: The variant name, 'avatars/me.png' becomes 'thumbnails/avatars/me.png_64.jpg'. The original
+        extension is kept, 'avatars/me.png' and 'avatars/me.jpg' are different avatars
+    """
+    return '{}/{}_{}.jpg'.format(VARIANTS_FOLDER, name, size)
+
+
+def variant_size(size):
+    """
+    Picks the smallest variant at least as big as the displayed size
+    :param int size: Displayed side in pixels
+    :return int: Variant size or None if the original has to be used
+    """
+    for variant in const.AVATAR_SIZES:
+        if variant >= size:
+            return variant
+    return None
+
+
+def create_variants(name, storage=default_storage):
+    """
+    Creates the square variants of an avatar as progressive JPEGs, replacing the existing ones
+    :param str name: Storage name of the original avatar
+    :param storage: Storage of the avatar and its variants
+    """
+    with storage.open(name) as avatar:
+        image = Image.open(avatar)
+        image.load()
+    if image.mode != 'RGB':
+        # flatten transparency over white, JPEG has no alpha channel
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[3])
+        image = background
+
+    for size in const.AVATAR_SIZES:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        content = BytesIO()
+        variant.save(content, 'JPEG', quality=const.AVATAR_QUALITY, optimize=True, progressive=True)
+        target = variant_name(name, size)
+        # the storage would pick another name if the file exists
+        storage.delete(target)
+        storage.save(target, ContentFile(content.getvalue()))
+    log.debug('Created variants of avatar %s' % name)
+
+
+def avatar_url(user, size):
+    """
+    Gets the url of the avatar variant that fits the displayed size
+    :param User user: Avatar owner
+    :param int size: Displayed side in pixels
+    :return str: Url of the variant or of the original avatar if it has no variants yet
+    """
+    variant = variant_size(size)
+    if user.avatar_resized and variant is not None:
+        return default_storage.url(variant_name(user.avatar.name, variant))
+    return default_storage.url(user.avatar.name)
@@ -1,4 +1,62 @@
 from datetime import timedelta
 
 DEFAULT_PROFILE_IMAGE_USER = 'default/profile_image.jpg'
+# Sides in pixels of the square avatar variants, bigger displays use the original
+AVATAR_SIZES = (32, 64, 256)
+AVATAR_QUALITY = 85
 EXPIRY_TOKEN_DELTA = timedelta(days=7)
+# Age of a never activated account before it is purged
+ABANDONED_ACCOUNT_AGE = timedelta(days=30)
+PROJECTS_PER_PAGE = 5
+
+# Seconds a cached fragment is fresh, after that it is rebuilt
+FRAGMENT_CACHE_TIMEOUT = 300
+# Extra seconds a stale fragment is kept to be served while one worker rebuilds it
+FRAGMENT_CACHE_STALE_TIMEOUT = 3600
+# Seconds a worker can hold the rebuild lock of a fragment
+FRAGMENT_CACHE_LOCK_TIMEOUT = 30
+# Number of first listing pages cached as a whole
+CACHED_LISTING_PAGES = 3
+
+# Seconds the user of an authenticated session is cached
+AUTH_USER_CACHE_TIMEOUT = 60
+# Seconds the number of pending scores of a user is cached
+PENDING_SCORES_CACHE_TIMEOUT = 600
+
+# Seconds before the first retry of a failed email, doubled on every attempt
+EMAIL_RETRY_BASE_DELAY = 60
+# Maximum seconds between two attempts of a failed email
+EMAIL_RETRY_MAX_DELAY = 3600
+# Emails sent over each SMTP connection before reconnecting
+EMAIL_MESSAGES_PER_CONNECTION = 100
+# Seconds a worker holds the emails it claimed, a worker that crashes while sending leaves them due again after
+EMAIL_SEND_LEASE = 600
+
+# Unreferenced attachment blobs younger than this are not collected, a project may be about to use them
+BLOB_UPLOAD_GRACE = timedelta(hours=1)
+
+# Bytes read from disk at a time when streaming a download
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Rows read per query when streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+# Static files precompressed by build_static
+STATIC_COMPRESSED_EXTENSIONS = ('.css', '.js', '.ico', '.svg', '.json', '.txt', '.html', '.map')
+# Seconds browsers cache the static files with hashed names, their content never changes
+STATIC_HASHED_MAX_AGE = 365 * 24 * 3600
+# Seconds browsers cache the static files without hash before revalidating them
+STATIC_MAX_AGE = 3600
+
+# Token buckets each worker keeps in memory with the local throttling backend
+THROTTLE_LOCAL_MAX_BUCKETS = 10000
+
+# Persistent database connections idle longer than this are checked before a request uses them
+DB_HEALTH_CHECK_IDLE = 30
+# Requests between two logs of the database connections opened and reused by a worker
+CONNECTION_STATS_LOG_INTERVAL = 1000
+
+# Seconds a client reads from the primary database after a write, longer than the replication lag
+REPLICA_PIN_SECONDS = 10
+# Cookie marking a client pinned to the primary database
+REPLICA_PIN_COOKIE = 'primary_pin'
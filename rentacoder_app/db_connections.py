@@ -0,0 +1,92 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+import rentacoder_app.constants as const
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """
+    Database connections opened and reused by this process for a database alias
+    """
+
+    def __init__(self):
+        self.opened = 0
+        self.reused = 0
+        # persistent connections closed by the health check before a request used them
+        self.discarded = 0
+
+    def __str__(self):
+        return 'opened {}, reused {}, discarded {}'.format(self.opened, self.reused, self.discarded)
+
+
+stats = defaultdict(ConnectionStats)
+requests_count = 0
+# time each connection of the current thread finished its last request, connections are per thread
+_last_used = threading.local()
+
+
+def count_opened(sender, connection, **kwargs):
+    stats[connection.alias].opened += 1
+
+
+connection_created.connect(count_opened)
+
+
+def log_stats():
+    for alias, alias_stats in sorted(stats.items()):
+        log.info('Database connections of worker {} to {}: {}'.format(os.getpid(), alias, alias_stats))
+
+
+def check_connection(connection, idle):
+    """
+    Checks a persistent connection before a request uses it, one left idle for a while may have been
+    dropped by the server or a proxy in between and the request would fail on its first query
+    :param connection: Connection wrapper of an alias
+    :param float idle: Seconds since the connection was last used
+    """
+    if idle < const.DB_HEALTH_CHECK_IDLE or connection.is_usable():
+        stats[connection.alias].reused += 1
+        return
+    log.warning('Discarding unusable connection to {} idle for {:.0f}s'.format(connection.alias, idle))
+    stats[connection.alias].discarded += 1
+    # the next query opens a new one
+    connection.close()
+
+
+class ConnectionHealthMiddleware:
+    """
+    Checks the persistent database connections kept by CONN_MAX_AGE before each request and counts the
+    connections opened versus reused, the counters are logged every CONNECTION_STATS_LOG_INTERVAL requests.
+    Django already closes the connections past their max age or with errors when a request starts
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        global requests_count
+
+        now = time.monotonic()
+        last_used = getattr(_last_used, 'times', {})
+        for connection in connections.all():
+            if connection.connection is not None and not connection.in_atomic_block:
+                check_connection(connection, now - last_used.get(connection.alias, now))
+
+        response = self.get_response(request)
+
+        now = time.monotonic()
+        _last_used.times = {connection.alias: now for connection in connections.all()
+                            if connection.connection is not None}
+
+        requests_count += 1
+        if requests_count % const.CONNECTION_STATS_LOG_INTERVAL == 0:
+            log_stats()
+        return response
@@ -0,0 +1,188 @@
+import mimetypes
+import os
+import posixpath
+import re
+import unicodedata
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views import static
+
+import rentacoder_app.constants as const
+from rentacoder_app.storage import BLOBS_FOLDER
+
+X_SENDFILE = 'x-sendfile'
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+
+# folders of MEDIA_ROOT holding attachments, 'files' has the ones uploaded before the blobs
+ATTACHMENT_FOLDERS = (BLOBS_FOLDER, 'files')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# characters that would break out of the quoted filename or the header
+FILENAME_UNSAFE_RE = re.compile(r'["\\\r\n]')
+
+# the file of a compressed attachment is sent as is, a Content-Encoding would make the browser
+# decompress it and save content that does not match its name
+ENCODING_TYPES = {
+    'gzip': 'application/gzip',
+    'bzip2': 'application/x-bzip2',
+    'xz': 'application/x-xz',
+    'compress': 'application/x-compress',
+}
+
+
+def _parse_range(header, size):
+    """
+    Parses a single byte range, multiple ranges are not supported and get the whole file
+    :param str header: Range header
+    :param int size: File size
+    :return: (start, end) inclusive, None to send the whole file or False if it can not be satisfied
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        # suffix range, the last bytes of the file
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """
+    A range is only honoured if the If-Range validator still matches the file
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(file, start, length, chunk_size):
+    """
+    Yields length bytes of the file from start, closing it at the end
+    """
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _sendfile_response(path):
+    """
+    Lets the front web server send the file, it also answers the range requests
+    """
+    response = HttpResponse()
+    if settings.ATTACHMENT_SENDFILE == X_SENDFILE:
+        response['X-Sendfile'] = path
+    else:
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.ATTACHMENT_ACCEL_PREFIX + relative_path
+    # the web server sets the real type from the file
+    del response['Content-Type']
+    return response
+
+
+def _content_type(filename):
+    """
+    Gets the type of an attachment from its name, compressed files keep the type of the compressed format
+    """
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding:
+        return ENCODING_TYPES.get(encoding, 'application/octet-stream')
+    return content_type or 'application/octet-stream'
+
+
+def _content_disposition(filename):
+    """
+    Builds the attachment Content-Disposition, non ASCII names are sent in an RFC 5987 filename* parameter
+    with an ASCII fallback for the clients that do not support it
+    """
+    filename = FILENAME_UNSAFE_RE.sub('', filename)
+    fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii') or 'download'
+    if fallback == filename:
+        return 'attachment; filename="{}"'.format(filename)
+    return 'attachment; filename="{}"; filename*=UTF-8\'\'{}'.format(fallback, quote(filename, safe=''))
+
+
+def serve_file(request, path, filename):
+    """
+    Sends a file that already passed the access checks. Conditional and single range requests are
+    answered here, or the transfer is handed to the web server when ATTACHMENT_SENDFILE is set
+    :param request: Django request object
+    :param str path: Absolute path of the file
+    :param str filename: Name offered to save the file
+    :return: The response
+    """
+    stat = os.stat(path)
+    etag = quote_etag('{:x}-{:x}'.format(int(stat.st_mtime), stat.st_size))
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    if settings.ATTACHMENT_SENDFILE:
+        response = _sendfile_response(path)
+    else:
+        size = stat.st_size
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and _if_range_matches(request, etag, last_modified):
+            byte_range = _parse_range(request.META['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+        content_type = _content_type(filename)
+        file = open(path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response.block_size = const.DOWNLOAD_CHUNK_SIZE
+            response['Content-Length'] = size
+        else:
+            start, end = byte_range
+            response = FileResponse(_read_range(file, start, end - start + 1, const.DOWNLOAD_CHUNK_SIZE),
+                                    status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = _content_disposition(filename)
+    return response
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serves MEDIA_URL in development, except the attachments, they are only downloaded through
+    download_attachment which checks the access
+    :param request: Django request object
+    :param str path: Path inside document_root
+    :param str document_root: MEDIA_ROOT
+    :param bool show_indexes: List the folders
+    :return: The file response
+    """
+    # normalized like django.views.static.serve does, 'avatars/../blobs' is a blob too
+    if posixpath.normpath(unquote(path)).lstrip('/').split('/')[0] in ATTACHMENT_FOLDERS:
+        raise Http404
+    return static.serve(request, path, document_root, show_indexes)
@@ -1,16 +1,156 @@
 import logging
+import time
 import urllib.parse
-from smtplib import SMTPException
+from collections import defaultdict
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import get_connection
 from django.template import loader
 from django.urls import reverse
 
+import rentacoder_app.constants as const
+
 logger = logging.getLogger(__name__)
 
+# notification types
+REGISTRATION = 'registration'
+RESET_PASSWORD = 'reset_password'
+YOU_APPLIED_TO_PROJECT = 'you_applied_to_project'
+CODER_APPLIED_TO_PROJECT = 'coder_applied_to_project'
+QUESTION_ASKED = 'question_asked'
+QUESTION_ANSWERED = 'question_answered'
+APPLICATION_ACCEPTED = 'application_accepted'
+PROJECT_CLOSED = 'project_closed'
+DIGEST = 'digest'
+
+
+class Notification:
+    """
+    Email template and subject of a notification type, the subject is formatted with the render context
+    """
+
+    def __init__(self, template_name, subject):
+        self.template_name = template_name
+        self.subject = subject
+
+
+NOTIFICATIONS = {
+    REGISTRATION: Notification('email/register_email.html', 'Welcome!'),
+    RESET_PASSWORD: Notification('email/reset_password.html', 'Reset password'),
+    YOU_APPLIED_TO_PROJECT: Notification('email/you_applied_to_project.html', 'Applied to Project {project.title}!'),
+    CODER_APPLIED_TO_PROJECT: Notification('email/coder_applied_to_project.html',
+                                           'Coder Applied to Project {project.title}!'),
+    QUESTION_ASKED: Notification('email/question_asked.html', 'Someone asked something in Project {project.title}!'),
+    QUESTION_ANSWERED: Notification('email/question_answered.html', 'Question answered for Project {project.title}!'),
+    APPLICATION_ACCEPTED: Notification('email/application_accepted.html', 'Accepted in Project {project.title}!'),
+    PROJECT_CLOSED: Notification('email/project_closed.html', 'Project {project.title} closed!'),
+    DIGEST: Notification('email/digest.html', 'Your {frequency} summary: {count} updates in your projects'),
+}
+
+
+class NotificationStats:
+    """
+    Render and send counters of a notification type in this process
+    """
+
+    def __init__(self):
+        self.rendered = 0
+        self.render_time = 0.0
+        self.sent = 0
+        self.send_time = 0.0
+
+    def __str__(self):
+        return 'rendered {} in {:.3f}s, sent {} in {:.3f}s'.format(self.rendered, self.render_time,
+                                                                   self.sent, self.send_time)
+
 
 class EmailManager:
+    # compiled templates by notification type, loaded once per process
+    templates = {}
+    stats = defaultdict(NotificationStats)
+
+    @staticmethod
+    def get_template(notification_type):
+        template = EmailManager.templates.get(notification_type)
+        if template is None:
+            template = loader.get_template(NOTIFICATIONS[notification_type].template_name)
+            EmailManager.templates[notification_type] = template
+        return template
+
+    @staticmethod
+    def notify(notification_type, context, recipients):
+        """
+        Renders a notification for many recipients in one pass and queues the emails, they are delivered by the
+        send_queued_emails command. Call it inside the transaction that triggers the notification so both are
+        committed together
+        :param str notification_type: One of NOTIFICATIONS
+        :param dict context: Context shared by every recipient
+        :param recipients: Tuples of recipient address and the context specific to that recipient
+        """
+        notification = NOTIFICATIONS[notification_type]
+        template = EmailManager.get_template(notification_type)
+
+        start = time.perf_counter()
+        emails = []
+        for recipient, recipient_context in recipients:
+            recipient_context = dict(context, **recipient_context)
+            emails.append((notification.subject.format(**recipient_context), recipient,
+                           template.render(recipient_context)))
+        elapsed = time.perf_counter() - start
+
+        stats = EmailManager.stats[notification_type]
+        stats.rendered += len(emails)
+        stats.render_time += elapsed
+        logger.debug('Rendered %s %s emails in %.3fs' % (len(emails), notification_type, elapsed))
+
+        EmailManager.queue_emails(notification_type, emails)
+
+    @staticmethod
+    def queue_emails(notification_type, emails):
+        """
+        Queues many emails with a single insert
+        :param str notification_type: One of NOTIFICATIONS
+        :param emails: Tuples of subject, recipient and rendered HTML body
+        """
+        # imported here, models import this module
+        from rentacoder_app.models import QueuedEmail
+
+        queued = QueuedEmail.objects.bulk_create(
+            QueuedEmail(notification=notification_type, subject=subject, recipient=recipient,
+                        html_message=html_message)
+            for subject, recipient, html_message in emails
+        )
+        logger.debug('%s %s emails queued' % (len(queued), notification_type))
+
+    @staticmethod
+    def send_messages(messages, chunk_size=const.EMAIL_MESSAGES_PER_CONNECTION):
+        """
+        Sends the messages opening one SMTP connection per chunk of chunk_size messages.
+        A failed message is reported and does not abort the rest
+        :param messages: Tuples of notification type and EmailMessage to send
+        :param int chunk_size: Messages sent over each connection
+        :return list: The error of each message, None if it was sent
+        """
+        errors = []
+        for start in range(0, len(messages), chunk_size):
+            connection = get_connection(fail_silently=False)
+            try:
+                for notification_type, message in messages[start:start + chunk_size]:
+                    sent_at = time.perf_counter()
+                    try:
+                        # no-op while the connection is open, reconnects after a failure closed it
+                        connection.open()
+                        connection.send_messages([message])
+                        errors.append(None)
+                        EmailManager.stats[notification_type].sent += 1
+                    except Exception as e:
+                        logger.error('Error sending email to %s. %s' % (', '.join(message.to), e))
+                        errors.append(e)
+                        connection.close()
+                    EmailManager.stats[notification_type].send_time += time.perf_counter() - sent_at
+            finally:
+                connection.close()
+        return errors
 
     @staticmethod
     def activate_account_email(user):
@@ -19,26 +159,10 @@ class EmailManager:
         :param user: The user to activate
         """
         try:
-
-            html_message = loader.render_to_string(
-                'email/register_email.html',
-                {
-                    'user_name': user.first_name,
-                    'url_token': urllib.parse.urljoin(settings.DOMAIN,
-                                                      reverse('validate_email_token', args=(user.email_token.value,))),
-                }
-            )
-
-            send_mail(
-                subject='Welcome!',
-                message='',
-                from_email='',
-                recipient_list=(user.email,),
-                fail_silently=False,
-                html_message=html_message
-            )
-        except SMTPException as e:
-            logger.error('Error sending registration email to %s-%s. %s' % (user.id, user.username, e))
+            url_token = urllib.parse.urljoin(settings.DOMAIN,
+                                             reverse('validate_email_token', args=(user.email_token.value,)))
+            EmailManager.notify(REGISTRATION, {'user_name': user.first_name, 'url_token': url_token},
+                                [(user.email, {})])
         except AttributeError as e:
             logger.error('Error obtaining token of %s-%s. %s' % (user.id, user.username, e))
 
@@ -50,29 +174,9 @@ class EmailManager:
         """
         try:
             url = urllib.parse.urljoin(settings.DOMAIN,
-                                       reverse('recover_password_get', args=[str(user.reset_password_token.value)]))
-
-            # render template
-            html_message = loader.render_to_string(
-                'email/reset_password.html',
-                {
-                    'user_first_name': user.first_name.capitalize(),
-                    'url_token': url,
-                }
-            )
-
-            logger.debug('Email template rendered')
-
-            send_mail(
-                subject='Reset password',
-                message='',
-                from_email='',
-                recipient_list=(user.email,),
-                fail_silently=False,
-                html_message=html_message
-            )
-            logger.debug('Email sent to %s' % user.email)
-        except SMTPException as e:
-            logger.error('Error sending recover password email to %s-%s. %s' % (user.id, user.username, e))
+                                       reverse('reset_password_get', args=[str(user.reset_password_token.value)]))
+            EmailManager.notify(RESET_PASSWORD, {'user_first_name': user.first_name.capitalize(), 'url_token': url},
+                                [(user.email, {})])
+            logger.debug('Email queued to %s' % user.email)
         except AttributeError as e:
             logger.error('Error obtaining token of %s-%s. %s' % (user.id, user.username, e))
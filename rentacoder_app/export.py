@@ -0,0 +1,121 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+import rentacoder_app.constants as const
+from rentacoder_app.models import Project, JobOffer, ProjectScore
+
+CSV = 'csv'
+JSON_LINES = 'jsonl'
+
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    JSON_LINES: 'application/x-ndjson',
+}
+
+
+class Export:
+    """
+    Describes an exportable resource: its queryset, exported fields and the lookups
+    used to filter it by owner, closed state and project start date
+    """
+
+    def __init__(self, model, fields, project_lookup):
+        """
+        :param model: Model to export
+        :param tuple fields: Fields written in each row
+        :param str project_lookup: Lookup from the model to its project, empty for projects
+        """
+        self.model = model
+        self.fields = fields
+        self.prefix = project_lookup + '__' if project_lookup else ''
+
+    def queryset(self, owner=None, closed=None, start=None, end=None):
+        """
+        Builds the queryset with every filter applied in SQL
+        :param owner: Id of the project owner
+        :param bool closed: Project closed state
+        :param date start: Minimum project start date
+        :param date end: Maximum project start date
+        :return QuerySet: Rows as tuples in the order of fields, ordered by id
+        """
+        filters = {}
+        if owner is not None:
+            filters[self.prefix + 'user_id'] = owner
+        if closed is not None:
+            filters[self.prefix + 'closed'] = closed
+        if start is not None:
+            filters[self.prefix + 'start_date__gte'] = start
+        if end is not None:
+            filters[self.prefix + 'start_date__lte'] = end
+        return self.model.objects.filter(**filters).order_by('id').values_list(*self.fields)
+
+
+EXPORTS = {
+    'projects': Export(Project, ('id', 'title', 'description', 'user_id', 'openings', 'start_date', 'end_date',
+                                 'closed'), ''),
+    'offers': Export(JobOffer, ('id', 'project_id', 'user_id', 'money', 'hours', 'message', 'accepted'), 'project'),
+    'scores': Export(ProjectScore, ('id', 'project_id', 'coder_id', 'owner_score', 'coder_score'), 'project'),
+}
+
+
+class Echo:
+    """
+    File like object whose write returns the value, lets csv.writer produce rows one at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_rows(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_lines_rows(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def keyset_rows(queryset, chunk_size):
+    """
+    Reads the rows in chunks of ids, each chunk is a short query of its own. iterator() would need
+    a server side cursor, which pgbouncer in transaction pooling mode can not keep, see DB_POOLING
+    :param QuerySet queryset: Rows ordered by id, with the id first
+    :param int chunk_size: Rows per query
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+WRITERS = {
+    CSV: csv_rows,
+    JSON_LINES: json_lines_rows,
+}
+
+
+def stream_export(name, export_format, **filters):
+    """
+    Streams an export, rows are read from the database in chunks so memory does not grow
+    with the number of rows
+    :param str name: Export name, one of EXPORTS
+    :param str export_format: One of CSV or JSON_LINES
+    :param filters: Filters of Export.queryset
+    :return StreamingHttpResponse: The export response
+    """
+    export = EXPORTS[name]
+    rows = keyset_rows(export.queryset(**filters), const.EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(WRITERS[export_format](export.fields, rows),
+                                     content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(name, export_format)
+    return response
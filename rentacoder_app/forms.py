@@ -1,5 +1,11 @@
+import logging
+
 from django import forms
-from rentacoder_app.models import Project, JobOffer, User, ProjectQuestion
+from rentacoder_app.avatars import create_variants
+from rentacoder_app.fragment_cache import bump_projects_version
+from rentacoder_app.models import Project, JobOffer, User, ProjectQuestion, Technology
+
+log = logging.getLogger(__name__)
 
 
 class NewProjectForm(forms.ModelForm):
@@ -8,7 +14,7 @@ class NewProjectForm(forms.ModelForm):
 
     class Meta:
         model = Project
-        exclude = ('user', 'closed')
+        exclude = ('user', 'closed', 'file_name', 'offers_count', 'accepted_count', 'questions_count')
 
 
 class ApplyToProjectForm(forms.ModelForm):
@@ -28,6 +34,67 @@ class AnswerQuestionForm(forms.ModelForm):
         model = ProjectQuestion
         fields = ('answer',)
 
+class TechnologyChoiceField(forms.ModelMultipleChoiceField):
+    def label_from_instance(self, technology):
+        counter = getattr(technology, 'counter', None)
+        return "{} ({})".format(technology.name, counter.open_projects if counter else 0)
+
+
+class TechnologyFilterForm(forms.Form):
+    """
+    Form used to filter the portal projects by technology
+    """
+    MATCH_ANY = 'any'
+    MATCH_ALL = 'all'
+    MATCH_CHOICES = ((MATCH_ANY, 'Any'), (MATCH_ALL, 'All'))
+
+    technology = TechnologyChoiceField(queryset=Technology.objects.select_related('counter').order_by('name'),
+                                       widget=forms.CheckboxSelectMultiple(), required=False)
+    match = forms.ChoiceField(choices=MATCH_CHOICES, required=False)
+
+    def filter(self, projects):
+        """
+        Filters the projects by the selected technologies
+        :param QuerySet projects: Projects to filter
+        :return QuerySet: Filtered projects
+        """
+        if not self.is_valid() or not self.cleaned_data.get('technology'):
+            return projects
+
+        technology_ids = [technology.pk for technology in self.cleaned_data['technology']]
+        if self.cleaned_data.get('match') == self.MATCH_ALL:
+            # one join per technology, projects must have all of them
+            for technology_id in technology_ids:
+                projects = projects.filter(technologies=technology_id)
+            return projects
+
+        # subquery over the join table avoids the duplicated rows of a plain join
+        project_ids = Project.technologies.through.objects.filter(technology_id__in=technology_ids) \
+            .values('project_id')
+        return projects.filter(id__in=project_ids)
+
+
+class SearchForm(forms.Form):
+    """
+    Form used to search projects by title and description
+    """
+    q = forms.CharField(max_length=200, label="Search")
+    include_closed = forms.BooleanField(required=False, label="Include closed projects")
+
+
+class ExportFilterForm(forms.Form):
+    """
+    Form used to filter the exports
+    """
+    CLOSED_CHOICES = (('', 'Any'), ('true', 'Closed'), ('false', 'Open'))
+
+    owner = forms.IntegerField(required=False)
+    closed = forms.TypedChoiceField(choices=CLOSED_CHOICES, coerce=lambda value: value == 'true', empty_value=None,
+                                    required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+
 class HorizontalRadioSelect(forms.RadioSelect):
     template_name = 'views/horizontal_select.html'
 
@@ -40,11 +107,31 @@ class ScoreForm(forms.Form):
 class UserProfileForm(forms.ModelForm):
     class Meta:
         model = User
-        fields = ('first_name', 'last_name', 'email', 'technologies', 'avatar')
+        fields = ('first_name', 'last_name', 'email', 'technologies', 'avatar', 'notification_frequency')
         widgets = {
             'technologies': forms.CheckboxSelectMultiple()
         }
 
+    def save(self, commit=True):
+        user = super(UserProfileForm, self).save(commit=False)
+        if not commit:
+            return user
+        # the user of the request may come from the cache, only the columns of the form are written
+        user.save(update_fields=[name for name in self._meta.fields if name != 'technologies'])
+        self._save_m2m()
+        if 'avatar' in self.changed_data:
+            # variants are created once on upload, pages never serve the full size image in a thumbnail
+            try:
+                create_variants(user.avatar.name)
+                user.avatar_resized = True
+                # the cached project cards show the avatar
+                bump_projects_version()
+            except (IOError, OSError) as e:
+                log.error('Error resizing avatar of %s. %s' % (user.username, e))
+                user.avatar_resized = False
+            user.save(update_fields=('avatar_resized',))
+        return user
+
 class RegisterForm(forms.Form):
     """
     Form used to register a new user
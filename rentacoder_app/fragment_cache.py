@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import time
+
+from django.core.cache import cache
+
+import rentacoder_app.constants as const
+
+log = logging.getLogger(__name__)
+
+PROJECTS_VERSION_KEY = 'projects:version'
+LOCK_SUFFIX = ':lock'
+
+
+def get_projects_version():
+    """
+    Gets the global projects version, every fragment built with an older version is stale
+    :return int: The current version
+    """
+    version = cache.get(PROJECTS_VERSION_KEY)
+    if version is None:
+        # start from the current time so an evicted version never goes back to a value already used
+        cache.add(PROJECTS_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(PROJECTS_VERSION_KEY)
+    return version
+
+
+def bump_projects_version():
+    """
+    Marks every cached project fragment as stale
+    """
+    try:
+        cache.incr(PROJECTS_VERSION_KEY)
+    except ValueError:
+        # version not in cache, initializing it is enough to invalidate the fragments
+        get_projects_version()
+
+
+def params_key(prefix, params):
+    """
+    Builds a cache key from request params
+    :param str prefix: Key prefix
+    :param QueryDict params: Request GET params
+    :return str: Cache key
+    """
+    query = '&'.join('{}={}'.format(key, ','.join(sorted(params.getlist(key)))) for key in sorted(params))
+    return '{}:{}'.format(prefix, hashlib.md5(query.encode('utf-8')).hexdigest())
+
+
+def _store(key, version, value, timeout):
+    """
+    Stores a fragment, the entry outlives its freshness so it can be served stale while it is rebuilt
+    """
+    cache.set(key, (version, time.time() + timeout, value), timeout + const.FRAGMENT_CACHE_STALE_TIMEOUT)
+    return value
+
+
+def _resolve(key, entry, version, build, timeout):
+    """
+    Returns the cached value if fresh, otherwise rebuilds it. When a stale copy exists only the
+    worker that takes the lock rebuilds it and the rest keep serving the stale copy
+    """
+    if entry is None:
+        return _store(key, version, build(), timeout)
+
+    entry_version, expires, value = entry
+    if entry_version == version and expires > time.time():
+        return value
+
+    lock_key = key + LOCK_SUFFIX
+    if not cache.add(lock_key, True, const.FRAGMENT_CACHE_LOCK_TIMEOUT):
+        log.debug('Serving stale fragment %s' % key)
+        return value
+    try:
+        return _store(key, version, build(), timeout)
+    finally:
+        cache.delete(lock_key)
+
+
+def get_fragment(key, build, timeout=const.FRAGMENT_CACHE_TIMEOUT):
+    """
+    Gets a fragment from the cache, building it if it is missing or stale
+    :param str key: Cache key
+    :param build: Callable that renders the fragment
+    :param int timeout: Seconds the fragment is fresh
+    :return: The fragment
+    """
+    return _resolve(key, cache.get(key), get_projects_version(), build, timeout)
+
+
+def get_fragments(objects, key_func, build, timeout=const.FRAGMENT_CACHE_TIMEOUT):
+    """
+    Gets the fragments of many objects with a single cache lookup
+    :param objects: Objects to get the fragments for
+    :param key_func: Callable that returns the cache key of an object
+    :param build: Callable that renders the fragment of an object
+    :param int timeout: Seconds the fragments are fresh
+    :return list: The fragments in the same order as the objects
+    """
+    version = get_projects_version()
+    keys = [key_func(obj) for obj in objects]
+    entries = cache.get_many(keys)
+    return [_resolve(key, entries.get(key), version, lambda obj=obj: build(obj), timeout)
+            for key, obj in zip(keys, objects)]
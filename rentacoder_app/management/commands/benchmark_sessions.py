@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from rentacoder_app.models import User
+
+SESSION_ENGINES = (
+    ('db', 'django.contrib.sessions.backends.db', 'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db',
+     'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+)
+PAGES = ('portal', 'my_projects', 'history', 'my_profile')
+
+
+class Command(BaseCommand):
+    help = 'Counts the database queries per authenticated request with each session engine, ' \
+           'using a throwaway user that is deleted afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Requests made to each page with every engine')
+
+    def measure(self, user, requests):
+        """
+        Logs in the user and requests the pages
+        :return: Total and session queries per request
+        """
+        client = Client()
+        client.login(username=user.username, password='benchmark')
+        # warm up the caches so only the steady state is measured
+        for page in PAGES:
+            client.get(reverse(page))
+
+        total = sessions = 0
+        for _ in range(requests):
+            for page in PAGES:
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(reverse(page))
+                total += len(queries)
+                sessions += sum(1 for query in queries if 'django_session' in query['sql'])
+        client.logout()
+        count = requests * len(PAGES)
+        return total / count, sessions / count
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        user = User.objects.create_user('session-benchmark', 'session-benchmark@localhost', 'benchmark',
+                                        is_active=True)
+        try:
+            for name, engine, message_storage in SESSION_ENGINES:
+                with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=message_storage,
+                                       ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+                    total, sessions = self.measure(user, options['requests'])
+                self.stdout.write('{:<15} {:.2f} queries per request, {:.2f} on the session table'.format(
+                    name, total, sessions))
+        finally:
+            user.delete()
+            teardown_test_environment()
@@ -0,0 +1,59 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import rentacoder_app.constants as const
+
+
+class Command(BaseCommand):
+    help = 'Collects the static files with hashed names and writes their gzip and Brotli variants. ' \
+           'Brotli variants need the optional brotli package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete the previously collected files first')
+
+    def compress(self, path, data, extension, compressor):
+        """
+        Writes a precompressed variant next to the file if it is smaller and missing or outdated
+        :return bool: The variant was written
+        """
+        target = path + extension
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            return False
+        compressed = compressor(data)
+        if len(compressed) >= len(data):
+            return False
+        with open(target, 'wb') as variant:
+            variant.write(compressed)
+        return True
+
+    def handle(self, *args, **options):
+        # the manifest storage writes the hashed copies and the manifest used by the {% static %} tag
+        call_command('collectstatic', interactive=False, clear=options['clear'], verbosity=options['verbosity'])
+
+        if brotli is None:
+            self.stderr.write('brotli is not installed, only gzip variants are written')
+
+        written = 0
+        for root, _, files in os.walk(settings.STATIC_ROOT):
+            for name in files:
+                if os.path.splitext(name)[1] not in const.STATIC_COMPRESSED_EXTENSIONS:
+                    continue
+                path = os.path.join(root, name)
+                with open(path, 'rb') as source:
+                    data = source.read()
+                written += self.compress(path, data, '.gz', lambda content: gzip.compress(content, 9))
+                if brotli is not None:
+                    written += self.compress(path, data, '.br', lambda content: brotli.compress(content))
+        self.stdout.write(self.style.SUCCESS('Wrote {} precompressed files to {}'.format(
+            written, staticfiles_storage.location)))
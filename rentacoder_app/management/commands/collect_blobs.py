@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from rentacoder_app.models import Blob
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the reference counts of the attachment blobs and deletes the unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many blobs are unreferenced')
+
+    def handle(self, *args, **options):
+        # deleted projects release their blobs, the counts only drift after raw SQL deletes or a crash
+        Blob.repair_refcounts(Blob.objects.all())
+        if options['dry_run']:
+            unreferenced = Blob.objects.filter(refcount__lte=0).count()
+            self.stdout.write('{} unreferenced blobs'.format(unreferenced))
+            return
+        collected = Blob.collect(Blob.objects.all())
+        self.stdout.write(self.style.SUCCESS('Deleted {} unreferenced blobs'.format(collected)))
@@ -0,0 +1,263 @@
+import random
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from rentacoder_app.fragment_cache import bump_projects_version
+from rentacoder_app.models import User, Technology, TechnologyCounter, Project, JobOffer, ProjectQuestion, \
+    ProjectScore
+from rentacoder_app.search import index_projects
+
+TECHNOLOGY_NAMES = (
+    'Python', 'Django', 'JavaScript', 'React', 'Angular', 'Vue', 'Node.js', 'Java', 'Spring', 'Kotlin', 'Swift',
+    'C#', '.NET', 'PHP', 'Laravel', 'Ruby', 'Rails', 'Go', 'Rust', 'C++', 'PostgreSQL', 'MySQL', 'MongoDB',
+    'Redis', 'Docker', 'Kubernetes', 'AWS', 'Azure', 'Android', 'iOS', 'Flutter', 'TypeScript', 'GraphQL',
+    'Elasticsearch', 'Scala', 'Haskell', 'Elixir', 'Unity', 'WordPress', 'Shopify',
+)
+THINGS = ('web app', 'API', 'mobile app', 'dashboard', 'plugin', 'integration', 'landing page', 'scraper',
+          'chat bot', 'data pipeline', 'migration', 'admin panel', 'online store', 'game', 'report')
+WORDS = ('we', 'need', 'a', 'developer', 'to', 'build', 'maintain', 'fix', 'the', 'existing', 'new', 'users',
+         'payments', 'search', 'login', 'with', 'tests', 'deploy', 'performance', 'design', 'for', 'our',
+         'customers', 'data', 'reports', 'fast', 'simple', 'clean', 'code', 'documentation', 'deadline')
+OPENINGS = (1, 2, 3, 4, 5, 8, 10)
+OPENINGS_WEIGHTS = (50, 20, 10, 8, 6, 4, 2)
+# scores lean towards the top, like in most rating systems
+SCORE_WEIGHTS = (3, 4, 10, 30, 53)
+# a closed project has this ratio of its scores still pending on each side
+PENDING_SCORE_RATIO = 0.1
+ANSWERED_QUESTION_RATIO = 0.6
+# owners and coders activity follows a zipf distribution, a few users post and apply most of the time
+ACTIVITY_EXPONENT = 1.1
+# and so does the popularity of the technologies
+TECHNOLOGY_EXPONENT = 1.2
+MAX_TECHNOLOGIES_PER_PROJECT = 5
+MAX_ITEMS_PER_PROJECT = 200
+PROJECTS_DAYS = 2 * 365
+
+
+def zipf_cum_weights(size, exponent):
+    """
+    Cumulative weights of a zipf distribution, the item at rank r is drawn with probability 1 / r^exponent
+    :param int size: Number of items
+    :param float exponent: Skew, higher concentrates the draws in the first items
+    :return list: Cumulative weights for random.choices
+    """
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, size + 1)))
+
+
+class Skewed:
+    """
+    Population of ids drawn with a zipf distribution, the first ids are the most drawn
+    """
+
+    def __init__(self, rng, ids, exponent, shuffle=True):
+        """
+        :param Random rng: Random generator
+        :param ids: Ids to draw from
+        :param float exponent: Skew of the distribution
+        :param bool shuffle: Shuffle the ranks so the most drawn ids are not the lowest ones
+        """
+        self.rng = rng
+        self.ids = list(ids)
+        if shuffle:
+            rng.shuffle(self.ids)
+        self.cum_weights = zipf_cum_weights(len(self.ids), exponent)
+
+    def one(self):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights)[0]
+
+    def distinct(self, count, exclude=None):
+        """
+        Draws up to count distinct ids, popular ids repeat so fewer may be returned
+        """
+        if count <= 0:
+            return []
+        draws = self.rng.choices(self.ids, cum_weights=self.cum_weights, k=count * 2)
+        return [item for item in dict.fromkeys(draws) if item != exclude][:count]
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic users, technologies, projects, job offers, questions and scores ' \
+           'with skewed distributions, for load tests and query plans with production sized tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Number of users to create')
+        parser.add_argument('--technologies', type=int, default=len(TECHNOLOGY_NAMES),
+                            help='Number of technologies to use, missing ones are created')
+        parser.add_argument('--projects', type=int, default=100000, help='Number of projects to create')
+        parser.add_argument('--offers', type=float, default=5,
+                            help='Mean number of job offers per project')
+        parser.add_argument('--questions', type=float, default=2,
+                            help='Mean number of questions per project')
+        parser.add_argument('--closed-ratio', type=float, default=0.3,
+                            help='Ratio of closed projects, the accepted coders of those get scores')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the random generator')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of users or projects created per transaction')
+        parser.add_argument('--password', default='password', help='Password of every created user')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.totals = {}
+        started = time.perf_counter()
+
+        user_ids = self.create_users(options['users'], options['password'])
+        technology_ids = self.get_technologies(options['technologies'])
+        if options['projects'] and len(user_ids) < 2:
+            self.stderr.write('At least two users are needed to create projects')
+            return
+        self.create_projects(options['projects'], user_ids, technology_ids, options)
+
+        # the projects and users were created with explicit ids, move the sequences past them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Project]):
+                cursor.execute(sql)
+        self.recompute_reputation(user_ids)
+        bump_projects_version()
+
+        elapsed = time.perf_counter() - started
+        rows = sum(self.totals.values())
+        for label, total in self.totals.items():
+            self.stdout.write('{}: {}'.format(label, total))
+        self.stdout.write(self.style.SUCCESS('Created {} rows in {:.1f}s, {:.0f} rows/s'.format(
+            rows, elapsed, rows / elapsed if elapsed else 0)))
+
+    def count(self, label, objects):
+        self.totals[label] = self.totals.get(label, 0) + len(objects)
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last_id=Max('id'))['last_id'] or 0) + 1
+
+    def create_users(self, number, password):
+        # hashing is slow on purpose, every user shares the same hash
+        password = make_password(password)
+        first_id = self.next_id(User)
+        for start in range(first_id, first_id + number, self.batch_size):
+            users = [User(id=user_id, username='user{}'.format(user_id), email='user{}@example.com'.format(user_id),
+                          first_name='User', last_name=str(user_id), password=password, is_active=True)
+                     for user_id in range(start, min(start + self.batch_size, first_id + number))]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            self.count('Users', users)
+        return list(range(first_id, first_id + number))
+
+    def get_technologies(self, number):
+        names = list(TECHNOLOGY_NAMES[:number]) + ['Technology {}'.format(n)
+                                                   for n in range(len(TECHNOLOGY_NAMES), number)]
+        existing = set(Technology.objects.filter(name__in=names).values_list('name', flat=True))
+        technologies = [Technology(name=name) for name in names if name not in existing]
+        Technology.objects.bulk_create(technologies)
+        self.count('Technologies', technologies)
+        # in the order of the names, the first ones are the most popular
+        ids = dict(Technology.objects.filter(name__in=names).values_list('name', 'id'))
+        return [ids[name] for name in names]
+
+    def create_projects(self, number, user_ids, technology_ids, options):
+        rng = self.rng
+        owners = Skewed(rng, user_ids, ACTIVITY_EXPONENT)
+        coders = Skewed(rng, user_ids, ACTIVITY_EXPONENT)
+        # popularity follows the order of the names
+        technologies = Skewed(rng, technology_ids, TECHNOLOGY_EXPONENT, shuffle=False)
+
+        open_projects = dict.fromkeys(technology_ids, 0)
+        first_id = self.next_id(Project)
+        first_day = date.today() - timedelta(days=PROJECTS_DAYS)
+        for start in range(first_id, first_id + number, self.batch_size):
+            end = min(start + self.batch_size, first_id + number)
+            projects, links, offers, questions, scores = [], [], [], [], []
+            for project_id in range(start, end):
+                # newer projects have later start dates
+                start_date = first_day + timedelta(days=PROJECTS_DAYS * (project_id - first_id) // number)
+                project = Project(id=project_id, user_id=owners.one(), start_date=start_date,
+                                  end_date=start_date + timedelta(days=rng.randint(7, 180)),
+                                  openings=rng.choices(OPENINGS, OPENINGS_WEIGHTS)[0],
+                                  closed=rng.random() < options['closed_ratio'])
+
+                project_technologies = technologies.distinct(rng.randint(1, MAX_TECHNOLOGIES_PER_PROJECT))
+                links.extend(Project.technologies.through(project_id=project_id, technology_id=technology_id)
+                             for technology_id in project_technologies)
+                if not project.closed:
+                    for technology_id in project_technologies:
+                        open_projects[technology_id] += 1
+                project.title = 'Build a {} {}'.format(rng.choice(TECHNOLOGY_NAMES), rng.choice(THINGS))[:50]
+                project.description = ' '.join(rng.choices(WORDS, k=rng.randint(10, 60))).capitalize() + '.'
+
+                project_offers = self.create_offers(project, coders, options['offers'])
+                offers.extend(project_offers)
+                if project.closed:
+                    scores.extend(self.create_scores(project, project_offers))
+                project_questions = self.create_questions(project, coders, options['questions'])
+                questions.extend(project_questions)
+
+                project.offers_count = len(project_offers)
+                project.accepted_count = sum(offer.accepted for offer in project_offers)
+                project.questions_count = len(project_questions)
+                projects.append(project)
+
+            with transaction.atomic():
+                Project.objects.bulk_create(projects)
+                Project.technologies.through.objects.bulk_create(links)
+                JobOffer.objects.bulk_create(offers)
+                ProjectQuestion.objects.bulk_create(questions)
+                ProjectScore.objects.bulk_create(scores)
+                index_projects(projects)
+            for label, objects in (('Projects', projects), ('Project technologies', links),
+                                   ('Job offers', offers), ('Questions', questions), ('Scores', scores)):
+                self.count(label, objects)
+            self.stdout.write('Projects {}/{}'.format(end - first_id, number))
+
+        for technology_id, delta in open_projects.items():
+            TechnologyCounter.update_counts([technology_id], delta)
+
+    def items_count(self, mean):
+        """
+        Number of offers or questions of a project, exponentially distributed: most projects get a few
+        and some get many
+        """
+        if mean <= 0:
+            return 0
+        return min(int(self.rng.expovariate(1.0 / mean)), MAX_ITEMS_PER_PROJECT)
+
+    def create_offers(self, project, coders, mean):
+        rng = self.rng
+        coder_ids = coders.distinct(self.items_count(mean), exclude=project.user_id)
+        accepted = min(project.openings, len(coder_ids))
+        if not project.closed:
+            # open projects are still hiring
+            accepted = rng.randint(0, accepted)
+        return [JobOffer(project_id=project.id, user_id=coder_id, money=int(rng.lognormvariate(6, 0.8)),
+                         hours=max(int(rng.lognormvariate(3.5, 0.7)), 1), message=' '.join(rng.choices(WORDS, k=12)),
+                         accepted=n < accepted)
+                for n, coder_id in enumerate(coder_ids)]
+
+    def create_scores(self, project, offers):
+        rng = self.rng
+
+        def score():
+            return 0 if rng.random() < PENDING_SCORE_RATIO else rng.choices(range(1, 6), SCORE_WEIGHTS)[0]
+
+        return [ProjectScore(project_id=project.id, coder_id=offer.user_id, owner_score=score(), coder_score=score())
+                for offer in offers if offer.accepted]
+
+    def create_questions(self, project, coders, mean):
+        rng = self.rng
+        return [ProjectQuestion(project_id=project.id, user_id=coders.one(),
+                                question=' '.join(rng.choices(WORDS, k=rng.randint(5, 20))) + '?',
+                                answer=' '.join(rng.choices(WORDS, k=10)) if rng.random() < ANSWERED_QUESTION_RATIO
+                                else '')
+                for _ in range(self.items_count(mean))]
+
+    def recompute_reputation(self, user_ids):
+        if not user_ids:
+            return
+        # update by primary key ranges to keep every transaction short
+        for start in range(user_ids[0], user_ids[-1] + 1, self.batch_size):
+            with transaction.atomic():
+                User.recompute_reputation(User.objects.filter(id__gte=start, id__lt=start + self.batch_size))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min, Max
+
+from rentacoder_app.models import User, EmailToken, ResetPasswordToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired email and reset password tokens and never activated accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of primary keys scanned per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows would be deleted')
+
+    def purge(self, label, queryset, batch_size, dry_run):
+        if dry_run:
+            self.stdout.write('{}: {} would be deleted'.format(label, queryset.count()))
+            return
+
+        ids = queryset.aggregate(first_id=Min('id'), last_id=Max('id'))
+        total = 0
+        # delete by primary key ranges to keep every transaction and its locks short
+        for start in range((ids['first_id'] or 1) - 1, ids['last_id'] or 0, batch_size):
+            with transaction.atomic():
+                _, deleted = queryset.filter(id__gt=start, id__lte=start + batch_size).delete()
+            # only count the rows of the model, not the related rows deleted in cascade
+            total += deleted.get(queryset.model._meta.label, 0)
+        self.stdout.write(self.style.SUCCESS('{}: {} deleted'.format(label, total)))
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        self.purge('Email tokens', EmailToken.expired(), batch_size, dry_run)
+        self.purge('Reset password tokens', ResetPasswordToken.expired(), batch_size, dry_run)
+        # deleting an account also deletes its tokens
+        self.purge('Abandoned accounts', User.abandoned(), batch_size, dry_run)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rentacoder_app.models import Project
+from rentacoder_app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full text search index of the projects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of projects indexed per batch')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_index(Project.objects.order_by('id'), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Indexed {} projects'.format(total)))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from rentacoder_app.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the offers, accepted offers and questions counters of the projects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of project ids updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Project.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        total = 0
+        # update by primary key ranges to keep every transaction short
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                total += Project.repair_counters(Project.objects.filter(id__gt=start, id__lte=start + batch_size))
+        self.stdout.write(self.style.SUCCESS('Repaired counters of {} projects'.format(total)))
@@ -0,0 +1,62 @@
+import logging
+from multiprocessing import Pool
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+import rentacoder_app.constants as const
+from rentacoder_app.avatars import create_variants, variant_name
+from rentacoder_app.fragment_cache import bump_projects_version
+from rentacoder_app.models import User
+
+log = logging.getLogger(__name__)
+
+
+def resize(name):
+    """
+    Creates the variants of an avatar in a worker process
+    :return: The avatar name and the error, None if the variants were created
+    """
+    try:
+        create_variants(name)
+        return name, None
+    except (IOError, OSError) as e:
+        return name, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Creates the thumbnail variants of the default avatar and of the avatars uploaded before ' \
+           'they were resized on upload, run it on every deploy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes, one per CPU by default')
+        parser.add_argument('--all', action='store_true',
+                            help='Recreate the variants of every avatar, not only the missing ones')
+
+    def handle(self, *args, **options):
+        users = User.objects.all() if options['all'] else User.objects.filter(avatar_resized=False)
+        # users sharing an avatar, like the default one, are resized once
+        names = list(users.exclude(avatar='').order_by().values_list('avatar', flat=True).distinct())
+        # new users are saved as resized with the default avatar, its variants are created here
+        default_variants = [variant_name(const.DEFAULT_PROFILE_IMAGE_USER, size) for size in const.AVATAR_SIZES]
+        if const.DEFAULT_PROFILE_IMAGE_USER not in names and \
+                not all(default_storage.exists(variant) for variant in default_variants):
+            names.append(const.DEFAULT_PROFILE_IMAGE_USER)
+        # the workers do not use the database, do not share the connection with them
+        connection.close()
+
+        resized = failed = 0
+        with Pool(options['processes'], initializer=django.setup) as pool:
+            for name, error in pool.imap_unordered(resize, names):
+                if error is None:
+                    User.objects.filter(avatar=name).update(avatar_resized=True)
+                    resized += 1
+                else:
+                    log.error('Error resizing avatar %s. %s' % (name, error))
+                    failed += 1
+
+        bump_projects_version()
+        self.stdout.write(self.style.SUCCESS('Resized {} avatars, {} failed'.format(resized, failed)))
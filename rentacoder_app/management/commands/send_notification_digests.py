@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from rentacoder_app.models import User, NotificationEvent
+
+
+class Command(BaseCommand):
+    help = 'Queues the digest of the owners with hourly or daily notifications, run it from cron at that frequency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('frequency', choices=(User.NOTIFY_HOURLY, User.NOTIFY_DAILY),
+                            help='Digest frequency to send')
+
+    def handle(self, *args, **options):
+        digests, events = NotificationEvent.send_digests(options['frequency'])
+        self.stdout.write('Queued {} digests with {} events'.format(digests, events))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentacoder_app.email_manager import EmailManager
+from rentacoder_app.models import QueuedEmail
+
+
+class Command(BaseCommand):
+    help = 'Delivers the queued emails in batches, retrying failed ones with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Number of emails delivered over each SMTP connection')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Attempts before an email is marked as dead')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting when it is empty')
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='Seconds to wait between polls when the queue is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                sent, retried, dead = QueuedEmail.deliver_batch(options['batch_size'], options['max_attempts'])
+                if sent or retried or dead:
+                    self.stdout.write('Sent {}, retried {}, dead {}'.format(sent, retried, dead))
+                elif options['loop']:
+                    time.sleep(options['sleep'])
+                else:
+                    break
+        finally:
+            for notification_type, stats in sorted(EmailManager.stats.items()):
+                self.stdout.write('{}: {}'.format(notification_type or 'unknown', stats))
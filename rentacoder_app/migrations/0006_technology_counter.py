@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 15:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Technology = apps.get_model('rentacoder_app', 'Technology')
+    TechnologyCounter = apps.get_model('rentacoder_app', 'TechnologyCounter')
+    counts = Technology.objects.filter(project__closed=False).annotate(open_projects=Count('project'))
+    TechnologyCounter.objects.bulk_create(
+        TechnologyCounter(technology_id=technology.pk, open_projects=technology.open_projects)
+        for technology in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0005_unique_togethers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnologyCounter',
+            fields=[
+                ('technology', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='rentacoder_app.Technology')),
+                ('open_projects', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'technology_counter',
+            },
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='technologies',
+            field=models.ManyToManyField(blank=True, to='rentacoder_app.Technology'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 16:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+SQLITE_CREATE = "CREATE VIRTUAL TABLE project_search USING fts5(title, description)"
+SQLITE_FILL = "INSERT INTO project_search(rowid, title, description) SELECT id, title, description FROM project"
+
+POSTGRES_CREATE = """
+CREATE TABLE project_search (
+    project_id integer PRIMARY KEY REFERENCES project(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+)"""
+POSTGRES_INDEX = "CREATE INDEX project_search_document_idx ON project_search USING GIN (document)"
+POSTGRES_FILL = """
+INSERT INTO project_search(project_id, document)
+SELECT id, setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', description), 'B')
+FROM project"""
+
+DROP = "DROP TABLE IF EXISTS project_search"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = (SQLITE_CREATE, SQLITE_FILL)
+    elif vendor == 'postgresql':
+        statements = (POSTGRES_CREATE, POSTGRES_INDEX, POSTGRES_FILL)
+    else:
+        raise NotImplementedError('Project search is not supported in %s' % vendor)
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute(DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0006_technology_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 16:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Project = apps.get_model('rentacoder_app', 'Project')
+    JobOffer = apps.get_model('rentacoder_app', 'JobOffer')
+    ProjectQuestion = apps.get_model('rentacoder_app', 'ProjectQuestion')
+
+    def count(queryset):
+        counts = queryset.filter(project=OuterRef('pk')).order_by().values('project').annotate(count=Count('pk'))
+        return Coalesce(Subquery(counts.values('count'), output_field=models.IntegerField()), 0)
+
+    Project.objects.update(
+        offers_count=count(JobOffer.objects.all()),
+        accepted_count=count(JobOffer.objects.filter(accepted=True)),
+        questions_count=count(ProjectQuestion.objects.all()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0007_project_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='offers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='questions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
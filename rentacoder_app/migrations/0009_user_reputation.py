@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 16:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_reputation(apps, schema_editor):
+    User = apps.get_model('rentacoder_app', 'User')
+    ProjectScore = apps.get_model('rentacoder_app', 'ProjectScore')
+
+    def aggregate(lookup, score_field, function):
+        scores = ProjectScore.objects.filter(**{lookup: OuterRef('pk'), score_field + '__gt': 0}).order_by() \
+            .values(lookup).annotate(value=function(score_field))
+        return Coalesce(Subquery(scores.values('value'), output_field=models.IntegerField()), 0)
+
+    User.objects.update(
+        coder_score_sum=aggregate('coder', 'coder_score', Sum),
+        coder_score_count=aggregate('coder', 'coder_score', Count),
+        owner_score_sum=aggregate('project__user', 'owner_score', Sum),
+        owner_score_count=aggregate('project__user', 'owner_score', Count),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0008_project_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='coder_score_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='coder_score_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='owner_score_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='owner_score_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_reputation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 17:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import rentacoder_app.common
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0012_notification_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailtoken',
+            name='expiry_date',
+            field=models.DateTimeField(db_index=True, default=rentacoder_app.common.default_expiration_delta, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='resetpasswordtoken',
+            name='expiry_date',
+            field=models.DateTimeField(db_index=True, default=rentacoder_app.common.default_expiration_delta, editable=False),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+import django.utils.timezone
+import rentacoder_app.storage
+
+
+def fill_file_names(apps, schema_editor):
+    Project = apps.get_model('rentacoder_app', 'Project')
+    # files uploaded before deduplication keep their name after the 'files/' folder
+    Project.objects.filter(file__startswith='files/').update(file_name=Substr('file', len('files/') + 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0014_user_avatar_resized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('uploaded', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'blob',
+            },
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='file_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=rentacoder_app.storage.ContentAddressedStorage(), upload_to='files'),
+        ),
+        migrations.RunPython(fill_file_names, migrations.RunPython.noop),
+    ]
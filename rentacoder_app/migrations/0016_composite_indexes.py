@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 16:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# scores are pending only for a short time, partial indexes keep just those rows. The sqlite backend binds
+# the query params so its planner can not match a partial index WHERE, only postgresql gets them
+POSTGRES_CREATE = (
+    "CREATE INDEX project_score_pending_owner_idx ON project_score (coder_id) WHERE owner_score = 0",
+    "CREATE INDEX project_score_pending_coder_idx ON project_score (project_id) WHERE coder_score = 0",
+)
+POSTGRES_DROP = (
+    "DROP INDEX IF EXISTS project_score_pending_owner_idx",
+    "DROP INDEX IF EXISTS project_score_pending_coder_idx",
+)
+
+# sqlite databases migrated with django 1.11 on sqlite 3.26+ lost the indexes of the tables created in
+# 0001_initial when they were rebuilt, the project technologies one also enforces the many to many uniqueness
+SQLITE_INDEXES = (
+    ('project_technologies', ('project_id', 'technology_id'), True),
+    ('project_technologies', ('technology_id',), False),
+    ('rentacoder_app_projectquestion', ('user_id',), False),
+)
+
+
+def create_partial_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for table, columns, unique in SQLITE_INDEXES:
+                constraints = connection.introspection.get_constraints(cursor, table).values()
+                if any(constraint['columns'][:len(columns)] == list(columns) for constraint in constraints
+                       if constraint['index'] or constraint['unique']):
+                    continue
+                schema_editor.execute('CREATE {}INDEX {}_{}_idx ON {} ({})'.format(
+                    'UNIQUE ' if unique else '', table, '_'.join(columns), table, ', '.join(columns)))
+
+
+def drop_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0015_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(fields=['project', 'accepted'], name='job_offer_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['closed', '-id'], name='project_closed_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'closed', '-id'], name='project_user_closed_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectquestion',
+            index=models.Index(fields=['project', 'id'], name='project_question_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectscore',
+            index=models.Index(fields=['coder', 'owner_score'], name='project_score_coder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectscore',
+            index=models.Index(fields=['project', 'coder_score'], name='project_score_project_idx'),
+        ),
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
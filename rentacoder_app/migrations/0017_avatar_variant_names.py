@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 17:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def reset_avatar_variants(apps, schema_editor):
+    User = apps.get_model('rentacoder_app', 'User')
+    # the variants used to be named without the avatar extension, 'me.png' and 'me.jpg' shared them.
+    # run resize_avatars after this migration to recreate them with the new names
+    User.objects.update(avatar_resized=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentacoder_app', '0016_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_avatar_variants, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,50 @@
 import logging
+import os
 import urllib.parse
-from random import randint
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
 from uuid import uuid4
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
 from django.db import models, transaction, IntegrityError
-from django.db.models import Q, Avg
+from django.db.models.signals import post_delete
+from django.db.models import Q, F, Count, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 
 import rentacoder_app.constants as const
 import rentacoder_app.errors as err
-from rentacoder_app import fields
+from rentacoder_app import email_manager, fields
 from rentacoder_app.common import default_expiration_delta
 from rentacoder_app.email_manager import EmailManager
+from rentacoder_app.fragment_cache import bump_projects_version
+from rentacoder_app.storage import BLOBS_FOLDER, ContentAddressedStorage, blob_digest, blob_name
 
 log = logging.getLogger(__name__)
 
 
+def exclude_from_update(instance, fields, kwargs):
+    """
+    Leaves fields out of the update of a loaded instance, they are changed with F() updates and the loaded
+    values may be stale. Inserts and copies to another database still write every column
+    :param instance: Instance being saved
+    :param tuple fields: Names of the fields to leave out
+    :param dict kwargs: Arguments of save, update_fields is set in place
+    """
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return
+    if kwargs.get('using', instance._state.db) != instance._state.db:
+        return
+    kwargs['update_fields'] = [field.name for field in instance._meta.concrete_fields
+                               if not field.primary_key and field.name not in fields]
+
+
 class Technology(models.Model):
     name = models.CharField(max_length=100)
 
@@ -29,6 +55,45 @@ class Technology(models.Model):
         return self.name
 
 
+class TechnologyCounter(models.Model):
+    """
+    Number of open projects using a technology, maintained when projects are created, edited and closed
+    so the portal facets do not need to group the projects technologies on every request
+    """
+    technology = models.OneToOneField('Technology', on_delete=models.CASCADE, primary_key=True,
+                                      related_name='counter')
+    open_projects = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "technology_counter"
+
+    @staticmethod
+    def update_counts(technology_ids, delta):
+        """
+        Adds delta to the open projects counter of the given technologies
+        :param technology_ids: Ids of the technologies to update
+        :param int delta: Value to add, negative to decrement
+        """
+        technology_ids = set(technology_ids)
+        if not technology_ids or not delta:
+            return
+
+        counters = TechnologyCounter.objects.filter(technology_id__in=technology_ids)
+        if delta < 0:
+            # never go below zero
+            counters = counters.filter(open_projects__gte=-delta)
+        counters.update(open_projects=F('open_projects') + delta)
+
+        if delta > 0:
+            # create the counters of technologies that did not have one yet
+            existing = TechnologyCounter.objects.filter(technology_id__in=technology_ids) \
+                .values_list('technology_id', flat=True)
+            TechnologyCounter.objects.bulk_create(
+                TechnologyCounter(technology_id=technology_id, open_projects=delta)
+                for technology_id in technology_ids.difference(existing)
+            )
+
+
 # A User can publish Projects and create JobOffers in Projects
 class User(AbstractUser):
     """
@@ -38,33 +103,135 @@ class User(AbstractUser):
         username
         password
     """
+    NOTIFY_IMMEDIATELY = 'immediate'
+    NOTIFY_HOURLY = 'hourly'
+    NOTIFY_DAILY = 'daily'
+    NOTIFICATION_FREQUENCY_CHOICES = ((NOTIFY_IMMEDIATELY, 'Immediately'), (NOTIFY_HOURLY, 'Hourly digest'),
+                                      (NOTIFY_DAILY, 'Daily digest'))
+    # changed only with F() updates and recompute_reputation, see update_reputation
+    REPUTATION_FIELDS = ('coder_score_sum', 'coder_score_count', 'owner_score_sum', 'owner_score_count')
+
     technologies = models.ManyToManyField('Technology', blank=True)
     avatar = models.ImageField(upload_to='avatars', default=const.DEFAULT_PROFILE_IMAGE_USER)
+    # the avatar variants of AVATAR_SIZES exist, see avatars.create_variants
+    avatar_resized = models.BooleanField(default=False)
     email = models.EmailField(unique=True, db_index=True)
     is_active = models.BooleanField(default=False)
     deleted = models.BooleanField(default=False)
+    # running reputation, the averages are sum / count of the scores received
+    coder_score_sum = models.PositiveIntegerField(default=0)
+    coder_score_count = models.PositiveIntegerField(default=0)
+    owner_score_sum = models.PositiveIntegerField(default=0)
+    owner_score_count = models.PositiveIntegerField(default=0)
+    # how the owner gets notified of applications and questions in their projects
+    notification_frequency = models.CharField(max_length=10, choices=NOTIFICATION_FREQUENCY_CHOICES,
+                                              default=NOTIFY_IMMEDIATELY)
 
     def save(self, *args, **kwargs):
         """
-        Save user and if user is superuser, activate it.
+        Save user and if user is superuser, activate it. Updates leave the reputation out, the instance
+        may come from the cache and its sums be older than the scores given since
         """
         if not self.id and self.is_superuser:
             self.is_active = True
+        exclude_from_update(self, self.REPUTATION_FIELDS, kwargs)
+        if self.avatar.name == const.DEFAULT_PROFILE_IMAGE_USER:
+            # the variants of the default avatar are created on deploy by resize_avatars
+            self.avatar_resized = True
         super(User, self).save(*args, **kwargs)
+        User.invalidate_cached_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        User.invalidate_cached_user(self.pk)
+        return super(User, self).delete(*args, **kwargs)
+
+    @staticmethod
+    def _cached_user_key(user_id):
+        return 'auth:user:{}'.format(user_id)
+
+    @staticmethod
+    def get_cached_user(user_id):
+        """
+        Gets the user of an authenticated session from the cache, loading it only on a miss
+        :param user_id: Id of the user
+        :return User: The user or None if it does not exist
+        """
+        key = User._cached_user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(key, user, const.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    @staticmethod
+    def invalidate_cached_user(user_id):
+        """
+        Removes the cached user once the current transaction commits, the next request loads it again
+        :param user_id: Id of the changed user
+        """
+        key = User._cached_user_key(user_id)
+        transaction.on_commit(lambda: cache.delete(key))
 
     def get_coder_score(self):
         coder_score = "No scores yet"
-        if ProjectScore.objects.filter(coder=self, coder_score__gt=0).exists():
-            coder_score = ProjectScore.objects.filter(coder=self).aggregate(Avg('coder_score')).get('coder_score__avg')
+        if self.coder_score_count:
+            coder_score = self.coder_score_sum / self.coder_score_count
         return coder_score
 
     def get_owner_score(self):
         owner_score = "No scores yet"
-        if ProjectScore.objects.filter(project__user=self, owner_score__gt=0).exists():
-            owner_score = ProjectScore.objects.filter(project__user=self).aggregate(Avg('owner_score')).get(
-                'owner_score__avg')
+        if self.owner_score_count:
+            owner_score = self.owner_score_sum / self.owner_score_count
         return owner_score
 
+    @staticmethod
+    def update_reputation(user_id, role, previous_score, score):
+        """
+        Adds a score to the running reputation of a user, must run in the transaction that saves the score
+        :param user_id: Id of the scored user
+        :param str role: 'coder' or 'owner'
+        :param int previous_score: The score before the update, 0 if it was pending
+        :param int score: The new score
+        """
+        sum_field = '{}_score_sum'.format(role)
+        count_field = '{}_score_count'.format(role)
+        updates = {sum_field: F(sum_field) + (score - previous_score)}
+        if not previous_score:
+            updates[count_field] = F(count_field) + 1
+        User.objects.filter(pk=user_id).update(**updates)
+        User.invalidate_cached_user(user_id)
+
+    @staticmethod
+    def recompute_reputation(users):
+        """
+        Recomputes the running reputation of the given users from their project scores
+        :param QuerySet users: Users to recompute
+        :return int: Number of updated users
+        """
+        def aggregate(lookup, score_field, function):
+            scores = ProjectScore.objects.filter(**{lookup: OuterRef('pk'), score_field + '__gt': 0}).order_by() \
+                .values(lookup).annotate(value=function(score_field))
+            return Coalesce(Subquery(scores.values('value'), output_field=models.IntegerField()), 0)
+
+        return users.update(
+            coder_score_sum=aggregate('coder', 'coder_score', Sum),
+            coder_score_count=aggregate('coder', 'coder_score', Count),
+            owner_score_sum=aggregate('project__user', 'owner_score', Sum),
+            owner_score_count=aggregate('project__user', 'owner_score', Count),
+        )
+
+    @staticmethod
+    def abandoned():
+        """
+        Accounts registered and never activated, their activation token expired long ago
+        :return QuerySet: The abandoned accounts
+        """
+        return User.objects.filter(is_active=False, is_superuser=False, last_login__isnull=True,
+                                   date_joined__lt=timezone.now() - const.ABANDONED_ACCOUNT_AGE)
+
     @staticmethod
     def get_user_by_email(email):
         """
@@ -234,7 +401,7 @@ class Token(models.Model):
     Used to validate account
     """
     value = models.UUIDField(default=uuid4, editable=False, unique=True, db_index=True)
-    expiry_date = models.DateTimeField(default=default_expiration_delta, editable=False)
+    expiry_date = models.DateTimeField(default=default_expiration_delta, editable=False, db_index=True)
     user = models.OneToOneField(to='User', unique=True, editable=False)
 
     def is_valid(self):
@@ -244,6 +411,13 @@ class Token(models.Model):
         """
         return self.expiry_date >= timezone.now()
 
+    @classmethod
+    def expired(cls):
+        """
+        :return QuerySet: Tokens past their expiry date
+        """
+        return cls.objects.filter(expiry_date__lt=timezone.now())
+
     class Meta:
         abstract = True
 
@@ -258,25 +432,95 @@ class Project(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     closed = models.BooleanField(default=False)
-    file = models.FileField(upload_to='files', null=True, blank=True)
+    file = models.FileField(upload_to='files', storage=ContentAddressedStorage(), null=True, blank=True)
+    # uploaded name of the file, the stored blob is named by its content
+    file_name = models.CharField(max_length=255, blank=True)
+    # denormalized counters, kept up to date with F() updates, see update_counters and COUNTER_FIELDS
+    offers_count = models.PositiveIntegerField(default=0)
+    accepted_count = models.PositiveIntegerField(default=0)
+    questions_count = models.PositiveIntegerField(default=0)
     # duration: calculated in days, weeks, months?
 
+    # changed only with F() updates, see update_counters
+    COUNTER_FIELDS = ('offers_count', 'accepted_count', 'questions_count')
+
+    _url = None
+    # stored file name when the project was loaded, to reference count the blobs
+    _loaded_file = ''
+
     class Meta:
         db_table = "project"
+        indexes = [
+            # portal listing, open projects newest first
+            models.Index(fields=['closed', '-id'], name='project_closed_id_idx'),
+            # my projects and history, the projects of an owner by state newest first
+            models.Index(fields=['user', 'closed', '-id'], name='project_user_closed_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        project = super(Project, cls).from_db(db, field_names, values)
+        if 'file' in field_names:
+            project._loaded_file = values[field_names.index('file')] or ''
+        return project
+
+    def save(self, *args, **kwargs):
+        """
+        Save project, move the blob references if the file changed and invalidate the cached project
+        fragments once the transaction commits. Updates leave the counters out, writing back the values
+        loaded with the project would undo the increments committed since
+        """
+        if self.file and not self.file._committed:
+            self.file_name = os.path.basename(self.file.name)
+        elif not self.file:
+            self.file_name = ''
+        exclude_from_update(self, self.COUNTER_FIELDS, kwargs)
+        with transaction.atomic():
+            super(Project, self).save(*args, **kwargs)
+            file = self.file.name or ''
+            if file != self._loaded_file:
+                Blob.add_reference(file)
+                Blob.release(self._loaded_file)
+                self._loaded_file = file
+        transaction.on_commit(bump_projects_version)
+
+    def get_file_name(self):
+        """
+        :return str: The uploaded name of the file
+        """
+        return self.file_name or os.path.basename(self.file.name)
 
     @staticmethod
-    def generate(number=1):
-        last_project = Project.objects.last()
-        next_id = (last_project and last_project.pk + 1) or 1
-        for n in range(number):
-            date = timezone.now()
-            Project.objects.create(title="Project %i" % next_id, description="Decription %i" % next_id,
-                                   user_id=1, openings=randint(1, 10),
-                                   start_date=date, end_date=date)
-            next_id += 1
+    def update_counters(project_id, **deltas):
+        """
+        Atomically adds the deltas to the project counters
+        :param project_id: Id of the project to update
+        :param deltas: Counter names and values to add, e.g. offers_count=1
+        """
+        Project.objects.filter(pk=project_id).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+    @staticmethod
+    def repair_counters(projects):
+        """
+        Recomputes the counters of the given projects from the offers and questions tables
+        :param QuerySet projects: Projects to repair
+        :return int: Number of updated projects
+        """
+        def count(queryset):
+            counts = queryset.filter(project=OuterRef('pk')).order_by().values('project').annotate(count=Count('pk'))
+            return Coalesce(Subquery(counts.values('count'), output_field=models.IntegerField()), 0)
+
+        return projects.update(
+            offers_count=count(JobOffer.objects.all()),
+            accepted_count=count(JobOffer.objects.filter(accepted=True)),
+            questions_count=count(ProjectQuestion.objects.all()),
+        )
 
     def get_url(self):
-        return urllib.parse.urljoin(settings.DOMAIN, reverse('project', kwargs={"pk": self.pk}))
+        # memoized, the notifications of a project ask for it once per recipient
+        if self._url is None:
+            self._url = urllib.parse.urljoin(settings.DOMAIN, reverse('project', kwargs={"pk": self.pk}))
+        return self._url
 
 # Users can post JobOffers for a Project
 class JobOffer(models.Model):
@@ -290,6 +534,10 @@ class JobOffer(models.Model):
     class Meta:
         db_table = "job_offer"
         unique_together = (('project', 'user'),)
+        indexes = [
+            # accepted and pending offers of a project
+            models.Index(fields=['project', 'accepted'], name='job_offer_accepted_idx'),
+        ]
 
 
 # Once a project starts, accepted JobOffers create a pending Score for both the Owner and the Coder
@@ -303,15 +551,75 @@ class ProjectScore(models.Model):
     class Meta:
         db_table = "project_score"
         unique_together = (('project', 'coder'),)
+        indexes = [
+            # the two sides of the pending scores OR, see get_pending_scores_for_user
+            models.Index(fields=['coder', 'owner_score'], name='project_score_coder_idx'),
+            models.Index(fields=['project', 'coder_score'], name='project_score_project_idx'),
+        ]
+
+    def set_coder_score(self, score):
+        """
+        Saves the score given to the coder and updates the coder reputation in the same transaction
+        :param int score: Score from 1 to 5
+        """
+        with transaction.atomic():
+            previous_score = self.coder_score
+            self.coder_score = score
+            self.save()
+            User.update_reputation(self.coder_id, 'coder', previous_score, score)
+            ProjectScore.invalidate_num_pending_scores([self.coder_id, self.project.user_id])
+
+    def set_owner_score(self, score):
+        """
+        Saves the score given to the project owner and updates the owner reputation in the same transaction
+        :param int score: Score from 1 to 5
+        """
+        with transaction.atomic():
+            previous_score = self.owner_score
+            self.owner_score = score
+            self.save()
+            User.update_reputation(self.project.user_id, 'owner', previous_score, score)
+            ProjectScore.invalidate_num_pending_scores([self.coder_id, self.project.user_id])
 
     @staticmethod
     def get_pending_scores_for_user(user):
-        return ProjectScore.objects.filter(Q(coder=user, owner_score=0) | Q(project__user=user, coder_score=0))
+        # the owned projects go in a subquery instead of a join, so each side of the OR is answered by
+        # its own index and the results are merged instead of scanning every score
+        owned_projects = Project.objects.filter(user=user).values('id')
+        return ProjectScore.objects.filter(Q(coder=user, owner_score=0) |
+                                           Q(project__in=owned_projects, coder_score=0))
 
     @staticmethod
     def get_num_pending_scores_for_user(user):
         return int(ProjectScore.get_pending_scores_for_user(user).count())
 
+    @staticmethod
+    def _num_pending_scores_key(user_id):
+        return 'pending_scores:{}'.format(user_id)
+
+    @staticmethod
+    def get_cached_num_pending_scores_for_user(user):
+        """
+        Gets the number of pending scores of a user from the cache, counting them only on a miss
+        :param User user: The user
+        :return int: Number of pending scores
+        """
+        key = ProjectScore._num_pending_scores_key(user.pk)
+        num_pending_scores = cache.get(key)
+        if num_pending_scores is None:
+            num_pending_scores = ProjectScore.get_num_pending_scores_for_user(user)
+            cache.set(key, num_pending_scores, const.PENDING_SCORES_CACHE_TIMEOUT)
+        return num_pending_scores
+
+    @staticmethod
+    def invalidate_num_pending_scores(user_ids):
+        """
+        Removes the cached number of pending scores of the users once the current transaction commits
+        :param user_ids: Ids of the users whose pending scores changed
+        """
+        keys = [ProjectScore._num_pending_scores_key(user_id) for user_id in set(user_ids)]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
     @staticmethod
     def get_url():
         return urllib.parse.urljoin(settings.DOMAIN, reverse('scores'))
@@ -322,6 +630,12 @@ class ProjectQuestion(models.Model):
     question = models.TextField()
     answer = models.TextField()
 
+    class Meta:
+        indexes = [
+            # questions of a project in the order they were asked
+            models.Index(fields=['project', 'id'], name='project_question_project_idx'),
+        ]
+
 
 class ResetPasswordToken(Token):
     """
@@ -336,3 +650,250 @@ class EmailToken(Token):
     """
     email = models.EmailField()
     user = models.OneToOneField(to='User', unique=True, editable=False, related_name='email_token')
+
+
+class NotificationEvent(models.Model):
+    """
+    Owner notification waiting to be sent in a digest, recorded instead of an email when
+    the owner chose hourly or daily notifications
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    notification = models.CharField(max_length=40)
+    project = models.ForeignKey('Project', on_delete=models.CASCADE)
+    coder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='+')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "notification_event"
+
+    @staticmethod
+    def notify_owner(notification_type, project, coder=None):
+        """
+        Notifies the owner of a project right away or records the event for the next digest
+        depending on the owner notification frequency. Call it inside the transaction of the event
+        :param str notification_type: One of the owner notifications of email_manager
+        :param Project project: Project with its user loaded
+        :param User coder: User that triggered the event, if it is shown in the notification
+        """
+        owner = project.user
+        if owner.notification_frequency == User.NOTIFY_IMMEDIATELY:
+            recipient_context = {'user_name': owner.username}
+            if coder is not None:
+                recipient_context['coder_name'] = coder.username
+            EmailManager.notify(notification_type, {'project': project, 'project_url': project.get_url()},
+                                [(owner.email, recipient_context)])
+        else:
+            NotificationEvent.objects.create(user=owner, notification=notification_type, project=project, coder=coder)
+
+    @staticmethod
+    def send_digests(frequency):
+        """
+        Queues one digest email per owner with the events recorded since the last digest,
+        the events of every owner are read with a single query. Owners that switched back to immediate
+        notifications get the events recorded before the switch in the next digest of any frequency
+        :param str frequency: NOTIFY_HOURLY or NOTIFY_DAILY
+        :return: Number of digests and events sent
+        """
+        with transaction.atomic():
+            events = list(NotificationEvent.objects.select_for_update()
+                          .filter(user__notification_frequency__in=(frequency, User.NOTIFY_IMMEDIATELY))
+                          .select_related('user', 'project', 'coder')
+                          .order_by('user_id', 'id'))
+            if not events:
+                return 0, 0
+
+            recipients = []
+            for user, user_events in groupby(events, key=attrgetter('user')):
+                user_events = list(user_events)
+                recipients.append((user.email, {'user_name': user.username, 'events': user_events,
+                                                'count': len(user_events)}))
+            EmailManager.notify(email_manager.DIGEST, {'frequency': frequency}, recipients)
+
+            NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+        return len(recipients), len(events)
+
+
+class Blob(models.Model):
+    """
+    Content stored once by ContentAddressedStorage, refcount is the number of projects using it
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    # last time the content was uploaded, it may be about to be referenced
+    uploaded = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "blob"
+
+    @staticmethod
+    def touch(digest, size):
+        """
+        Records an upload of a blob
+        :param str digest: Blob digest
+        :param int size: Blob size in bytes
+        """
+        if not Blob.objects.filter(digest=digest).update(uploaded=timezone.now()):
+            try:
+                with transaction.atomic():
+                    Blob.objects.create(digest=digest, size=size)
+            except IntegrityError:
+                # uploaded at the same time by another request
+                Blob.objects.filter(digest=digest).update(uploaded=timezone.now())
+
+    @staticmethod
+    def add_reference(name):
+        """
+        Counts a new use of the blob stored with name, files that are not blobs are ignored
+        :param str name: Storage name of the file
+        """
+        digest = blob_digest(name)
+        if digest:
+            Blob.objects.filter(digest=digest).update(refcount=F('refcount') + 1)
+
+    @staticmethod
+    def release(name):
+        """
+        Removes a use of the blob stored with name, it is collected once the transaction commits
+        if nothing else uses it
+        :param str name: Storage name of the file
+        """
+        digest = blob_digest(name)
+        if digest:
+            Blob.objects.filter(digest=digest).update(refcount=F('refcount') - 1)
+            transaction.on_commit(lambda: Blob.collect(Blob.objects.filter(digest=digest)))
+
+    @staticmethod
+    def repair_refcounts(blobs):
+        """
+        Recomputes the reference counts from the projects, fixes the counts of projects deleted with raw SQL
+        :param QuerySet blobs: Blobs to recompute
+        """
+        references = Project.objects.filter(file__startswith=BLOBS_FOLDER + '/').order_by() \
+            .values('file').annotate(count=Count('id'))
+        # one update per distinct count, most blobs share a handful of counts
+        digests_by_count = defaultdict(list)
+        for reference in references:
+            digests_by_count[reference['count']].append(blob_digest(reference['file']))
+        with transaction.atomic():
+            blobs.update(refcount=0)
+            for count, digests in digests_by_count.items():
+                blobs.filter(digest__in=digests).update(refcount=count)
+
+    @staticmethod
+    def collect(blobs):
+        """
+        Deletes the unreferenced blobs, the ones uploaded in the last BLOB_UPLOAD_GRACE are kept because
+        the project using them may not be saved yet
+        :param QuerySet blobs: Candidate blobs
+        :return int: Number of deleted blobs
+        """
+        storage = Project._meta.get_field('file').storage
+        collected = 0
+        for blob in blobs.filter(refcount__lte=0, uploaded__lt=timezone.now() - const.BLOB_UPLOAD_GRACE):
+            with transaction.atomic():
+                # checked again under lock, the blob may have been uploaded or referenced meanwhile
+                if not Blob.objects.select_for_update().filter(
+                        pk=blob.pk, refcount__lte=0,
+                        uploaded__lt=timezone.now() - const.BLOB_UPLOAD_GRACE).exists():
+                    continue
+                storage.delete(blob_name(blob.digest))
+                blob.delete()
+                collected += 1
+        return collected
+
+
+def project_deleted(sender, instance, **kwargs):
+    """
+    Releases the blob of a deleted project and invalidates the cached project fragments, connected to
+    post_delete so the projects deleted by a cascade or QuerySet.delete() are released too
+    """
+    Blob.release(instance._loaded_file)
+    transaction.on_commit(bump_projects_version)
+
+
+post_delete.connect(project_deleted, sender=Project)
+
+
+class QueuedEmail(models.Model):
+    """
+    Outbound email, queued by the views in the transaction that triggers it
+    and delivered by the send_queued_emails command
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = ((STATUS_PENDING, 'Pending'), (STATUS_SENT, 'Sent'), (STATUS_DEAD, 'Dead'))
+
+    notification = models.CharField(max_length=40, blank=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    html_message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "email_queue"
+        index_together = (('status', 'next_attempt'),)
+
+    def to_message(self):
+        message = EmailMultiAlternatives(subject=self.subject, body='', to=(self.recipient,))
+        message.attach_alternative(self.html_message, 'text/html')
+        return message
+
+    def retry_delay(self):
+        """
+        Exponential backoff after a failed attempt
+        :return timedelta: Time to wait before the next attempt
+        """
+        seconds = const.EMAIL_RETRY_BASE_DELAY * 2 ** (self.attempts - 1)
+        return timedelta(seconds=min(seconds, const.EMAIL_RETRY_MAX_DELAY))
+
+    @staticmethod
+    def deliver_batch(batch_size, max_attempts):
+        """
+        Delivers a batch of due emails reusing the SMTP connection. Failed emails are retried with
+        exponential backoff and marked as dead after max_attempts. The emails are claimed and their results
+        recorded in two short transactions, nothing is locked while the SMTP server answers
+        :param int batch_size: Maximum number of emails to deliver
+        :param int max_attempts: Attempts before an email is marked as dead
+        :return: Number of sent, retried and dead emails
+        """
+        sent = retried = dead = 0
+        with transaction.atomic():
+            # skip rows locked by other workers so each email is claimed by only one of them
+            batch = list(QueuedEmail.objects.select_for_update(skip_locked=True)
+                         .filter(status=QueuedEmail.STATUS_PENDING, next_attempt__lte=timezone.now())
+                         .order_by('next_attempt', 'id')[:batch_size])
+            if not batch:
+                return sent, retried, dead
+            # the lease keeps the other workers away until the results are recorded, the attempt is counted
+            # now so an email that crashes the worker ends up dead
+            QueuedEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt=timezone.now() + timedelta(seconds=const.EMAIL_SEND_LEASE), attempts=F('attempts') + 1)
+
+        errors = EmailManager.send_messages([(email.notification, email.to_message()) for email in batch])
+
+        now = timezone.now()
+        with transaction.atomic():
+            sent_ids = [email.pk for email, error in zip(batch, errors) if error is None]
+            QueuedEmail.objects.filter(pk__in=sent_ids).update(status=QueuedEmail.STATUS_SENT, sent=now, last_error='')
+            sent = len(sent_ids)
+
+            for email, error in zip(batch, errors):
+                if error is None:
+                    continue
+                email.attempts += 1
+                email.last_error = str(error)
+                if email.attempts >= max_attempts:
+                    email.status = QueuedEmail.STATUS_DEAD
+                    dead += 1
+                else:
+                    email.next_attempt = now + email.retry_delay()
+                    retried += 1
+                email.save(update_fields=('status', 'attempts', 'next_attempt', 'last_error'))
+        return sent, retried, dead
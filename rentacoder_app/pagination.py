@@ -0,0 +1,155 @@
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+
+PAGE_PARAM = 'page'
+BEFORE_PARAM = 'before'
+AFTER_PARAM = 'after'
+
+
+class KeysetPage:
+    """
+    Page of a queryset ordered by '-id' and sliced with "before/after id X" filters
+    instead of OFFSET, so no COUNT(*) is issued and deep pages cost the same as the first one
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_previous, has_next, params):
+        """
+        :param list object_list: Objects in the page, newest first
+        :param bool has_previous: There are newer objects than the ones in the page
+        :param bool has_next: There are older objects than the ones in the page
+        :param QueryDict params: Request GET params, kept in the navigation links
+        """
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def previous_page_query(self):
+        return self._query(AFTER_PARAM, self.object_list[0].pk)
+
+    def next_page_query(self):
+        return self._query(BEFORE_PARAM, self.object_list[-1].pk)
+
+    def _query(self, param, value):
+        """
+        Builds the query string of a navigation link keeping every non pagination param
+        """
+        query = self.params.copy()
+        for key in (PAGE_PARAM, BEFORE_PARAM, AFTER_PARAM):
+            query.pop(key, None)
+        query[param] = value
+        return query.urlencode()
+
+
+def _cursor(value):
+    """
+    Parses a cursor param
+    :return: The id or None if it is missing or invalid
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def paginate_by_keyset(queryset, params, per_page):
+    """
+    Paginates a queryset ordered by '-id' using the 'before'/'after' id cursors in params
+    :param QuerySet queryset: Queryset ordered by '-id'
+    :param QueryDict params: Request GET params
+    :param int per_page: Objects per page
+    :return KeysetPage: The requested page
+    """
+    before = _cursor(params.get(BEFORE_PARAM))
+    after = _cursor(params.get(AFTER_PARAM))
+
+    # fetch one extra row to know if there is another page without counting, the other side of the
+    # cursor is checked with exists() as its rows may have been deleted since the link was rendered
+    if before is not None:
+        object_list = list(queryset.filter(id__lt=before)[:per_page + 1])
+        has_next = len(object_list) > per_page
+        object_list = object_list[:per_page]
+        has_previous = queryset.filter(id__gte=before).exists()
+    elif after is not None:
+        object_list = list(queryset.filter(id__gt=after).reverse()[:per_page + 1])
+        has_previous = len(object_list) > per_page
+        object_list = list(reversed(object_list[:per_page]))
+        has_next = queryset.filter(id__lte=after).exists()
+    else:
+        object_list = list(queryset[:per_page + 1])
+        has_next = len(object_list) > per_page
+        object_list = object_list[:per_page]
+        has_previous = False
+
+    # cursor pointing past the end of the listing, show the first page instead
+    if not object_list and (before is not None or after is not None):
+        params = params.copy()
+        params.pop(BEFORE_PARAM, None)
+        params.pop(AFTER_PARAM, None)
+        return paginate_by_keyset(queryset, params, per_page)
+
+    return KeysetPage(object_list, has_previous, has_next, params)
+
+
+def paginate_by_offset(queryset, page, per_page):
+    """
+    Paginates a queryset with the django Paginator, used by the legacy '?page=' urls
+    :param QuerySet queryset: Queryset to paginate
+    :param page: Requested page number
+    :param int per_page: Objects per page
+    :return Page: The requested page
+    """
+    paginator = Paginator(queryset, per_page)
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+def is_leading_page(params, pages):
+    """
+    Checks if the params request one of the first pages of a listing
+    :param QueryDict params: Request GET params
+    :param int pages: Number of leading pages
+    :return bool: The page is one of the first pages
+    """
+    if params.get(BEFORE_PARAM) is not None or params.get(AFTER_PARAM) is not None:
+        return False
+    page = params.get(PAGE_PARAM)
+    if page is None:
+        return True
+    try:
+        return int(page) <= pages
+    except ValueError:
+        return True
+
+
+def paginate(queryset, params, per_page):
+    """
+    Paginates a listing, keyset pagination is used unless the legacy 'page' param is present
+    :param QuerySet queryset: Queryset ordered by '-id'
+    :param QueryDict params: Request GET params
+    :param int per_page: Objects per page
+    :return: KeysetPage or Page
+    """
+    page = params.get(PAGE_PARAM)
+    if page is not None:
+        return paginate_by_offset(queryset, page, per_page)
+    return paginate_by_keyset(queryset, params, per_page)
@@ -0,0 +1,83 @@
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+import rentacoder_app.constants as const
+
+PRIMARY = 'default'
+# apps always read from the primary, a session written moments ago must be found in the next request
+PRIMARY_APPS = ('sessions',)
+
+_state = threading.local()
+
+
+def _reads_from_replica():
+    return getattr(_state, 'use_replica', False) and not getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of views decorated with use_replica to one of DATABASE_REPLICAS, everything
+    else reads and writes the primary. Once a request writes, its following reads go to the primary too
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _reads_from_replica() or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every database holds the same data
+        return True
+
+
+def is_pinned(request):
+    """
+    Checks if the client wrote recently and must read from the primary to see its own writes
+    :param request: The request
+    :return bool: The request must not use a replica
+    """
+    return const.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+def use_replica(view):
+    """
+    Decorator for views that only read, their queries go to a replica unless the client is pinned
+    to the primary after a recent write
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if is_pinned(request):
+            return view(request, *args, **kwargs)
+        _state.use_replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.use_replica = False
+
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins the client to the primary for REPLICA_PIN_SECONDS after a request writes, longer than
+    the replicas take to catch up, so the client reads its own writes
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(const.REPLICA_PIN_COOKIE, '1', max_age=const.REPLICA_PIN_SECONDS, httponly=True)
+        _state.wrote = False
+        return response
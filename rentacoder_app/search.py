@@ -0,0 +1,145 @@
+import logging
+import re
+
+from django.db import connection
+
+log = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'project_search'
+SEARCH_TERM_REGEX = re.compile(r'\w+', re.UNICODE)
+
+
+class SqliteSearchBackend:
+    """
+    Full text search backed by a SQLite FTS5 table whose rowid is the project id
+    """
+
+    @staticmethod
+    def index(cursor, projects):
+        ids = [(project.pk,) for project in projects]
+        cursor.executemany('DELETE FROM {} WHERE rowid = %s'.format(SEARCH_TABLE), ids)
+        cursor.executemany(
+            'INSERT INTO {}(rowid, title, description) VALUES (%s, %s, %s)'.format(SEARCH_TABLE),
+            [(project.pk, project.title, project.description) for project in projects]
+        )
+
+    @staticmethod
+    def clear(cursor):
+        cursor.execute('DELETE FROM {}'.format(SEARCH_TABLE))
+
+    @staticmethod
+    def search(queryset, terms):
+        # every term is quoted so user input is never parsed as FTS5 query syntax
+        match = ' '.join('"{}"'.format(term) for term in terms)
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=['{0}.rowid = project.id'.format(SEARCH_TABLE), '{0} MATCH %s'.format(SEARCH_TABLE)],
+            params=[match],
+            # bm25 is lower for better matches, title matches weigh more than description ones
+            select={'rank': 'bm25({0}, 10.0, 1.0)'.format(SEARCH_TABLE)},
+            order_by=['rank', '-id'],
+        )
+
+
+class PostgresSearchBackend:
+    """
+    Full text search backed by a weighted tsvector column with a GIN index
+    """
+
+    DOCUMENT = "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B')"
+
+    @staticmethod
+    def index(cursor, projects):
+        cursor.executemany(
+            'INSERT INTO {0}(project_id, document) VALUES (%s, {1}) '
+            'ON CONFLICT (project_id) DO UPDATE SET document = EXCLUDED.document'.format(
+                SEARCH_TABLE, PostgresSearchBackend.DOCUMENT),
+            [(project.pk, project.title, project.description) for project in projects]
+        )
+
+    @staticmethod
+    def clear(cursor):
+        cursor.execute('TRUNCATE {}'.format(SEARCH_TABLE))
+
+    @staticmethod
+    def search(queryset, terms):
+        query = "plainto_tsquery('english', %s)"
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=['{0}.project_id = project.id'.format(SEARCH_TABLE),
+                   '{0}.document @@ {1}'.format(SEARCH_TABLE, query)],
+            params=[' '.join(terms)],
+            select={'rank': 'ts_rank({0}.document, {1})'.format(SEARCH_TABLE, query)},
+            select_params=[' '.join(terms)],
+            order_by=['-rank', '-id'],
+        )
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    """
+    Gets the search backend of the default database
+    """
+    return BACKENDS[connection.vendor]
+
+
+def get_terms(query):
+    """
+    Splits a user query into search terms
+    :param str query: The query typed by the user
+    :return list: Words in the query
+    """
+    return SEARCH_TERM_REGEX.findall(query or '')
+
+
+def index_projects(projects):
+    """
+    Adds or updates the projects in the search index
+    :param projects: Projects to index
+    """
+    projects = list(projects)
+    if projects:
+        with connection.cursor() as cursor:
+            get_backend().index(cursor, projects)
+
+
+def search_projects(queryset, query):
+    """
+    Filters a projects queryset by a text query, ordered by relevance
+    :param QuerySet queryset: Projects to search in
+    :param str query: The query typed by the user
+    :return QuerySet: Matching projects, best matches first
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_backend().search(queryset, terms)
+
+
+def rebuild_index(projects, batch_size):
+    """
+    Rebuilds the whole search index
+    :param QuerySet projects: Projects to index
+    :param int batch_size: Number of projects indexed per statement batch
+    :return int: Number of indexed projects
+    """
+    total = 0
+    with connection.cursor() as cursor:
+        get_backend().clear(cursor)
+    # batches of ids instead of iterator(), pgbouncer can not keep a server side cursor
+    projects = projects.only('id', 'title', 'description').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(projects.filter(id__gt=last_id)[:batch_size])
+        index_projects(batch)
+        total += len(batch)
+        if len(batch) < batch_size:
+            break
+        last_id = batch[-1].id
+    log.info('Search index rebuilt with %s projects' % total)
+    return total
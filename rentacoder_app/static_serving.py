@@ -0,0 +1,75 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+import rentacoder_app.constants as const
+
+# names written by the manifest storage, 'css/base.55e7cbb9ba48.css'
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+# precompressed variants by preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _accepted_encodings(request):
+    """
+    :return set: Content codings in the Accept-Encoding header, without the ones with q=0
+    """
+    accepted = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def serve(request, path):
+    """
+    Serves a collected static file, picking the precompressed variant the client accepts. Hashed names
+    never change content so they are cached for a year, the rest are revalidated
+    :param request: Django request object
+    :param str path: Path inside STATIC_ROOT
+    :return FileResponse: The file
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    encoding = None
+    accepted = _accepted_encodings(request)
+    for coding, extension in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + extension):
+            encoding = coding
+            full_path += extension
+            break
+
+    stat = os.stat(full_path)
+    etag = quote_etag('{:x}-{:x}'.format(int(stat.st_mtime), stat.st_size))
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if HASHED_NAME_RE.search(path):
+        response['Cache-Control'] = 'public, max-age={}, immutable'.format(const.STATIC_HASHED_MAX_AGE)
+    else:
+        response['Cache-Control'] = 'public, max-age={}'.format(const.STATIC_MAX_AGE)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOBS_FOLDER = 'blobs'
+
+
+def blob_name(digest):
+    """
+    Gets the storage name of a blob, blobs are spread in folders by the first digest characters
+    :param str digest: SHA-256 hex digest of the content
+    :return str: The blob name
+    """
+    return '{}/{}/{}'.format(BLOBS_FOLDER, digest[:2], digest)
+
+
+def blob_digest(name):
+    """
+    Gets the digest of a blob from its storage name
+    :param str name: Storage name
+    :return str: The digest or None if the name is not a blob, like the files uploaded before deduplication
+    """
+    if name and name.startswith(BLOBS_FOLDER + '/'):
+        return os.path.basename(name)
+    return None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keeps each distinct content once, named by its SHA-256 digest. The uploaded
+    name is ignored, keep it elsewhere if it has to be shown. Blobs are reference counted by the Blob model
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the name is chosen by _save from the content
+        return name
+
+    def _save(self, name, content):
+        # hash while streaming to a temporary file next to the blobs so the final rename is atomic
+        directory = self.path(BLOBS_FOLDER)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            name = blob_name(digest.hexdigest())
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if settings.FILE_UPLOAD_PERMISSIONS is not None:
+                    os.chmod(temp_path, settings.FILE_UPLOAD_PERMISSIONS)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # imported here, models use this storage
+        from rentacoder_app.models import Blob
+        Blob.touch(digest.hexdigest(), size)
+        return name
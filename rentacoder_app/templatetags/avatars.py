@@ -0,0 +1,13 @@
+from django import template
+
+from rentacoder_app import avatars
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user, size):
+    """
+    Url of the smallest avatar variant of user that covers size pixels, {% avatar_url user 64 %}
+    """
+    return avatars.avatar_url(user, size)
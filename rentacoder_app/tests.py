@@ -1,3 +1,1166 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import Http404, HttpResponse, QueryDict
+from django.shortcuts import get_object_or_404
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import rentacoder_app.constants as const
+from rentacoder_app.auth_backend import processor
+from rentacoder_app.avatars import avatar_url, create_variants, variant_name
+from rentacoder_app.downloads import serve_file, serve_media
+from rentacoder_app.export import stream_export
+from rentacoder_app.forms import TechnologyFilterForm
+from rentacoder_app.fragment_cache import LOCK_SUFFIX, bump_projects_version, get_fragment, get_fragments
+from rentacoder_app.pagination import paginate_by_keyset
+from rentacoder_app.models import User, Technology, TechnologyCounter, Project, JobOffer, ProjectScore, \
+    ProjectQuestion, NotificationEvent, QueuedEmail, Blob, EmailToken, ResetPasswordToken
+from rentacoder_app import email_manager
+from rentacoder_app.replicas import ReplicaPinMiddleware, use_replica
+from rentacoder_app import static_serving
+from rentacoder_app.static_serving import HASHED_NAME_RE
+from rentacoder_app.search import get_backend, get_terms, index_projects, rebuild_index, search_projects
+from rentacoder_app.throttling import LocalBuckets, CacheBuckets
+
+# sqlite: "SCAN project" or "SCAN TABLE project AS U0", a table read without any index
+SQLITE_FULL_SCAN_REGEX = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+# postgresql: "Seq Scan on project", with enable_seqscan off it only shows up when no index is usable
+POSTGRES_FULL_SCAN_REGEX = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(sql):
+    """
+    Gets the query plan of a captured query
+    :param str sql: Query with its params interpolated
+    :return list: One line of the plan per node
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(sql):
+    """
+    Gets the tables a query reads without an index
+    :param str sql: Query with its params interpolated
+    :return list: Names of the fully scanned tables
+    """
+    regex = SQLITE_FULL_SCAN_REGEX if connection.vendor == 'sqlite' else POSTGRES_FULL_SCAN_REGEX
+    tables = []
+    for line in explain(sql):
+        match = regex.search(line.strip())
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+
+# the plans are checked on the primary, where the data is seeded
+@override_settings(DATABASE_REPLICAS=[])
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on every filtered query the views issue and fails if one of them reads a whole table,
+    catches a filter or ordering that stops matching the composite indexes of the models
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        cls.coder = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        coders = [User.objects.create_user('coder{}'.format(i), 'coder{}@example.com'.format(i), 'password',
+                                           is_active=True) for i in range(5)]
+
+        technologies = [Technology.objects.create(name=name) for name in ('python', 'django', 'sql')]
+        TechnologyCounter.objects.bulk_create(TechnologyCounter(technology=technology, open_projects=10)
+                                              for technology in technologies)
+
+        start = date.today()
+        for i in range(30):
+            project = Project.objects.create(title='Project {}'.format(i), description='Description {}'.format(i),
+                                             user=cls.owner if i % 3 else cls.coder, openings=2,
+                                             start_date=start, end_date=start + timedelta(days=30),
+                                             closed=i % 4 == 0)
+            project.technologies.add(*technologies[:i % 3 + 1])
+            for j, coder in enumerate(coders[:i % 5]):
+                JobOffer.objects.create(project=project, user=coder, money=100, hours=10, message='Hire me',
+                                        accepted=j == 0)
+            ProjectQuestion.objects.create(project=project, user=coders[0], question='When?')
+            if project.closed:
+                ProjectScore.objects.create(project=project, coder=cls.coder, owner_score=i % 2)
+                ProjectScore.objects.create(project=project, coder=coders[0], coder_score=3)
+        cls.project = Project.objects.filter(user=cls.owner, closed=False).first()
+
+    def setUp(self):
+        # the listings and pending scores are cached, start cold so every query runs
+        cache.clear()
+        self.client.force_login(self.owner)
+        if connection.vendor == 'postgresql':
+            # the tables are tiny, without this the planner prefers a sequential scan even with an index
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+
+    def assertNoFullScans(self, url):
+        """
+        Requests the url and checks the plan of every filtered query it issued. Unfiltered queries,
+        like the technologies list of the portal filter, read the whole table on purpose
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        selects = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('SELECT') and ' WHERE ' in query['sql']]
+        self.assertTrue(selects)
+        failures = ['{} in {}'.format(', '.join(tables), sql) for tables, sql in
+                    ((full_scans(sql), sql) for sql in selects) if tables]
+        self.assertFalse(failures, 'Full scans in {}:\n{}'.format(url, '\n'.join(failures)))
+
+    def test_portal(self):
+        self.assertNoFullScans(reverse('portal'))
+
+    def test_portal_next_page(self):
+        self.assertNoFullScans(reverse('portal') + '?before={}'.format(self.project.pk))
+
+    def test_portal_legacy_page(self):
+        self.assertNoFullScans(reverse('portal') + '?page=2')
+
+    def test_my_projects(self):
+        self.assertNoFullScans(reverse('my_projects'))
+
+    def test_history(self):
+        self.assertNoFullScans(reverse('history'))
+
+    def test_project(self):
+        self.assertNoFullScans(reverse('project', kwargs={'pk': self.project.pk}))
+
+    def test_applications(self):
+        self.client.force_login(self.coder)
+        self.assertNoFullScans(reverse('my_applications'))
+
+    def test_scores(self):
+        self.assertNoFullScans(reverse('scores'))
+
+    def test_coder_scores(self):
+        self.client.force_login(self.coder)
+        self.assertNoFullScans(reverse('scores'))
+
+    def test_user_profile(self):
+        self.assertNoFullScans(reverse('user_profile', kwargs={'pk': self.coder.pk}))
+
+    def test_my_profile(self):
+        self.assertNoFullScans(reverse('my_profile'))
+
+    def assertUsesIndex(self, queryset, *indexes):
+        """
+        Checks the plan of a queryset reads through every one of the given indexes
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN ') + sql, params)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        for index in indexes:
+            self.assertIn(index, plan)
+
+    def test_open_projects_index(self):
+        self.assertUsesIndex(Project.objects.filter(closed=False).order_by('-id')[:10], 'project_closed_id_idx')
+
+    def test_owner_projects_index(self):
+        self.assertUsesIndex(Project.objects.filter(user=self.owner, closed=False).order_by('-id'),
+                             'project_user_closed_id_idx')
+
+    def test_accepted_offers_index(self):
+        self.assertUsesIndex(JobOffer.objects.filter(project=self.project, accepted=True), 'job_offer_accepted_idx')
+
+    def test_project_questions_index(self):
+        self.assertUsesIndex(ProjectQuestion.objects.filter(project=self.project).order_by('id'),
+                             'project_question_project_idx')
+
+    def test_pending_scores_indexes(self):
+        if connection.vendor == 'postgresql':
+            indexes = ('project_score_pending_owner_idx', 'project_score_pending_coder_idx')
+        else:
+            indexes = ('project_score_coder_idx', 'project_score_project_idx')
+        self.assertUsesIndex(ProjectScore.get_pending_scores_for_user(self.owner), *indexes)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'Needs the replica of rentacoder_core.settings.testing')
+class ReplicaRouterTests(TestCase):
+    """
+    The replica is a separate database nothing copies rows to, a row only saved in one of them
+    shows which database a view read from
+    """
+    multi_db = True
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.replica = settings.DATABASE_REPLICAS[0]
+        cls.user = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        cls.user.save(using=cls.replica)
+        start = date.today()
+        Project(title='Only in the replica', description='Description', user=cls.user, start_date=start,
+                end_date=start, closed=True).save(using=cls.replica)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_read_only_view_reads_replica(self):
+        response = self.client.get(reverse('history'))
+        self.assertContains(response, 'Only in the replica')
+
+    def test_pinned_client_reads_primary(self):
+        self.client.cookies[const.REPLICA_PIN_COOKIE] = '1'
+        response = self.client.get(reverse('history'))
+        self.assertNotContains(response, 'Only in the replica')
+
+    def test_reads_after_write_use_primary(self):
+        databases = []
+
+        @use_replica
+        def view(request):
+            databases.append(Technology.objects.all().db)
+            Technology.objects.create(name='python')
+            databases.append(Technology.objects.all().db)
+            return HttpResponse()
+
+        ReplicaPinMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(databases, [self.replica, 'default'])
+
+    def test_write_pins_client(self):
+        def write(request):
+            Technology.objects.create(name='python')
+            return HttpResponse()
+
+        def read(request):
+            list(Technology.objects.all())
+            return HttpResponse()
+
+        request = RequestFactory().post('/')
+        self.assertIn(const.REPLICA_PIN_COOKIE, ReplicaPinMiddleware(write)(request).cookies)
+        self.assertNotIn(const.REPLICA_PIN_COOKIE, ReplicaPinMiddleware(read)(request).cookies)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [Technology.objects.create(name='technology {}'.format(n)).pk for n in range(5)]
+
+    def page(self, query):
+        page = paginate_by_keyset(Technology.objects.order_by('-id'), QueryDict(query), 2)
+        return [technology.pk for technology in page], page.has_previous(), page.has_next()
+
+    def test_first_page(self):
+        self.assertEqual(self.page(''), ([self.ids[4], self.ids[3]], False, True))
+
+    def test_last_page_through_before(self):
+        self.assertEqual(self.page('before={}'.format(self.ids[1])), ([self.ids[0]], True, False))
+
+    def test_middle_page_through_before(self):
+        self.assertEqual(self.page('before={}'.format(self.ids[3])), ([self.ids[2], self.ids[1]], True, True))
+
+    def test_first_page_through_after(self):
+        self.assertEqual(self.page('after={}'.format(self.ids[2])), ([self.ids[4], self.ids[3]], False, True))
+
+    def test_middle_page_through_after(self):
+        self.assertEqual(self.page('after={}'.format(self.ids[0])), ([self.ids[2], self.ids[1]], True, True))
+
+    def test_first_page_through_before_after_deletes(self):
+        # the rows newer than the cursor were deleted after the link was rendered
+        Technology.objects.filter(pk__gte=self.ids[3]).delete()
+        self.assertEqual(self.page('before={}'.format(self.ids[3])), ([self.ids[2], self.ids[1]], False, True))
+
+    def test_last_page_through_after_after_deletes(self):
+        Technology.objects.filter(pk__lte=self.ids[1]).delete()
+        self.assertEqual(self.page('after={}'.format(self.ids[1])), ([self.ids[3], self.ids[2]], True, False))
+
+
+class FragmentCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+
+    def build(self, value):
+        self.builds.append(value)
+        return 'card {} v{}'.format(value, len(self.builds))
+
+    def cards(self, values):
+        return get_fragments(values, 'card:{}'.format, self.build)
+
+    def test_cached_cards_are_reused(self):
+        self.assertEqual(self.cards([1, 2]), ['card 1 v1', 'card 2 v2'])
+        self.assertEqual(self.cards([1, 2]), ['card 1 v1', 'card 2 v2'])
+        self.assertEqual(self.builds, [1, 2])
+
+    def test_bump_invalidates_cached_cards(self):
+        self.cards([1, 2])
+        bump_projects_version()
+        self.assertEqual(self.cards([1, 2]), ['card 1 v3', 'card 2 v4'])
+        self.assertEqual(self.builds, [1, 2, 1, 2])
+
+    def test_stale_fragment_served_while_another_worker_rebuilds(self):
+        get_fragment('listing', lambda: self.build('listing'), timeout=0)
+        # another worker holds the rebuild lock
+        cache.add('listing' + LOCK_SUFFIX, True)
+        self.assertEqual(get_fragment('listing', lambda: self.build('listing')), 'card listing v1')
+        self.assertEqual(self.builds, ['listing'])
+
+    def test_stale_fragment_rebuilt_by_the_lock_holder(self):
+        get_fragment('listing', lambda: self.build('listing'), timeout=0)
+        self.assertEqual(get_fragment('listing', lambda: self.build('listing')), 'card listing v2')
+        # the lock is released once the fragment is stored
+        self.assertTrue(cache.add('listing' + LOCK_SUFFIX, True))
+
+
+class ProjectFormViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        cls.technology = Technology.objects.create(name='python')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def project_data(self, title):
+        return {
+            'title': title, 'description': 'Description', 'openings': 2, 'technologies': [self.technology.pk],
+            'start_date_year': 2026, 'start_date_month': 1, 'start_date_day': 1,
+            'end_date_year': 2026, 'end_date_month': 2, 'end_date_day': 1,
+        }
+
+    def test_new_project(self):
+        response = self.client.post(reverse('new_project'), self.project_data('New project'))
+        project = Project.objects.get(title='New project')
+        self.assertRedirects(response, reverse('project', kwargs={'pk': project.pk}))
+        self.assertEqual((project.user, project.offers_count, project.accepted_count, project.questions_count),
+                         (self.owner, 0, 0, 0))
+        self.assertEqual(TechnologyCounter.objects.get(technology=self.technology).open_projects, 1)
+
+    def test_edit_project(self):
+        self.client.post(reverse('new_project'), self.project_data('New project'))
+        project = Project.objects.get(title='New project')
+        Project.update_counters(project.pk, offers_count=1)
+
+        response = self.client.post(reverse('edit', kwargs={'pk': project.pk}), self.project_data('Edited'))
+        self.assertRedirects(response, reverse('project', kwargs={'pk': project.pk}))
+        project.refresh_from_db()
+        # the counters are not form fields, editing keeps them
+        self.assertEqual((project.title, project.offers_count), ('Edited', 1))
+
+    def test_edit_keeps_the_counters_updated_during_the_request(self):
+        self.client.post(reverse('new_project'), self.project_data('New project'))
+        project = Project.objects.get(title='New project')
+
+        def load_then_apply(*args, **kwargs):
+            loaded = get_object_or_404(*args, **kwargs)
+            # an offer made by another request after the project was loaded
+            Project.update_counters(loaded.pk, offers_count=1)
+            return loaded
+
+        with mock.patch('rentacoder_app.views.get_object_or_404', side_effect=load_then_apply):
+            self.client.post(reverse('edit', kwargs={'pk': project.pk}), self.project_data('Edited'))
+        project.refresh_from_db()
+        self.assertEqual((project.title, project.offers_count), ('Edited', 1))
+
+    def test_save_keeps_the_counters_updated_after_loading(self):
+        self.client.post(reverse('new_project'), self.project_data('New project'))
+        project = Project.objects.get(title='New project')
+        Project.update_counters(project.pk, offers_count=2, questions_count=1)
+        project.closed = True
+        project.save()
+        project.refresh_from_db()
+        self.assertEqual((project.closed, project.offers_count, project.questions_count), (True, 2, 1))
+
+
+class TechnologyFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        cls.python, cls.go, cls.rust = (Technology.objects.create(name=name) for name in ('python', 'go', 'rust'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def post_project(self, url, title, technologies):
+        self.client.post(url, {
+            'title': title, 'description': 'Description', 'openings': 1,
+            'technologies': [technology.pk for technology in technologies],
+            'start_date_year': 2026, 'start_date_month': 1, 'start_date_day': 1,
+            'end_date_year': 2026, 'end_date_month': 2, 'end_date_day': 1,
+        })
+        return Project.objects.get(title=title)
+
+    def assertCountersMatchOpenProjects(self):
+        counted = dict(TechnologyCounter.objects.values_list('technology_id', 'open_projects'))
+        for technology in Technology.objects.all():
+            open_projects = technology.project_set.filter(closed=False).count()
+            self.assertEqual(counted.get(technology.pk, 0), open_projects, technology.name)
+
+    def test_counters_follow_create_edit_and_close(self):
+        first = self.post_project(reverse('new_project'), 'First', [self.python, self.go])
+        self.post_project(reverse('new_project'), 'Second', [self.python])
+        self.assertCountersMatchOpenProjects()
+
+        self.post_project(reverse('edit', kwargs={'pk': first.pk}), 'First', [self.python, self.rust])
+        self.assertCountersMatchOpenProjects()
+
+        self.client.post(reverse('close_project', kwargs={'pk': first.pk}))
+        self.assertTrue(Project.objects.get(pk=first.pk).closed)
+        self.assertCountersMatchOpenProjects()
+        self.assertEqual(TechnologyCounter.objects.get(technology=self.python).open_projects, 1)
+
+    def test_filter_by_any_or_all_technologies(self):
+        both = self.post_project(reverse('new_project'), 'Both', [self.python, self.go])
+        python = self.post_project(reverse('new_project'), 'Python', [self.python])
+        projects = Project.objects.order_by('id')
+
+        any_form = TechnologyFilterForm({'technology': [self.python.pk, self.go.pk], 'match': 'any'})
+        self.assertEqual(list(any_form.filter(projects)), [both, python])
+        all_form = TechnologyFilterForm({'technology': [self.python.pk, self.go.pk], 'match': 'all'})
+        self.assertEqual(list(all_form.filter(projects)), [both])
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+
+    def create_project(self, title, description):
+        project = Project.objects.create(title=title, description=description, user=self.owner,
+                                         start_date=date.today(), end_date=date.today())
+        index_projects([project])
+        return project
+
+    def search(self, query):
+        return list(search_projects(Project.objects.all(), query))
+
+    def test_title_matches_rank_first(self):
+        in_description = self.create_project('Website', 'A django backend')
+        in_title = self.create_project('Django shop', 'An online store')
+        self.create_project('Mobile app', 'Flutter')
+        self.assertEqual(self.search('django'), [in_title, in_description])
+
+    def test_every_term_must_match(self):
+        project = self.create_project('Django shop', 'Payments with stripe')
+        self.create_project('Django blog', 'Comments')
+        self.assertEqual(self.search('django stripe'), [project])
+
+    def test_query_syntax_is_not_parsed(self):
+        project = self.create_project('Django shop', 'Payments')
+        self.assertEqual(self.search('django" OR NOT *'), [])
+        self.assertEqual(self.search('"django"'), [project])
+        self.assertEqual(self.search('  '), [])
+
+    def test_edited_projects_are_reindexed(self):
+        project = self.create_project('Django shop', 'Payments')
+        project.title = 'Rails shop'
+        project.save()
+        index_projects([project])
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(self.search('rails'), [project])
+
+    def test_rebuild_index(self):
+        projects = [self.create_project('Django {}'.format(number), 'Description') for number in range(5)]
+        with connection.cursor() as cursor:
+            get_backend().clear(cursor)
+        self.assertEqual(rebuild_index(Project.objects.all(), batch_size=2), 5)
+        self.assertEqual(sorted(self.search('django'), key=lambda project: project.pk), projects)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ProjectDetailQueriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        cls.project = Project.objects.create(title='Project', description='Description', user=cls.owner,
+                                             start_date=date.today(), end_date=date.today() + timedelta(days=30))
+        cls.project.technologies.add(Technology.objects.create(name='python'), Technology.objects.create(name='go'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+        # loads the cached session user
+        self.client.get(reverse('project', kwargs={'pk': self.project.pk}))
+
+    def add_offers_and_questions(self, count):
+        for number in range(count):
+            coder = User.objects.create_user('coder{}'.format(number), 'coder{}@example.com'.format(number),
+                                             'password', is_active=True)
+            JobOffer.objects.create(project=self.project, user=coder, money=100, hours=10, message='Offer',
+                                    accepted=number % 2 == 0)
+            ProjectQuestion.objects.create(project=self.project, user=coder, question='Question', answer='')
+
+    def assertProjectPageQueries(self):
+        # project with its owner, offers, questions and technologies, the session user is cached
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('project', kwargs={'pk': self.project.pk}))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_without_offers_and_questions(self):
+        self.assertProjectPageQueries()
+
+    def test_queries_do_not_grow_with_offers_and_questions(self):
+        self.add_offers_and_questions(10)
+        response = self.assertProjectPageQueries()
+        self.assertEqual(len(response.context['job_offers']), 10)
+        self.assertEqual(len(response.context['questions']), 10)
+
+
+class ProfileViewTests(TestCase):
+
+    def test_profile_update_keeps_the_reputation(self):
+        user = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        self.client.force_login(user)
+        # caches the user of the session
+        self.client.get(reverse('my_profile'))
+        # a score given by another request, the cached user still has the old sums
+        User.objects.filter(pk=user.pk).update(coder_score_sum=5, coder_score_count=1)
+
+        self.client.post(reverse('my_profile'), {'first_name': 'New', 'last_name': 'Name', 'email': user.email,
+                                                 'notification_frequency': User.NOTIFY_DAILY})
+        user.refresh_from_db()
+        self.assertEqual((user.first_name, user.notification_frequency), ('New', User.NOTIFY_DAILY))
+        self.assertEqual((user.coder_score_sum, user.coder_score_count), (5, 1))
+
+
+
+class PendingScoresBadgeTests(TransactionTestCase):
+    # the cached counts are dropped when the transaction commits
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True)
+        self.coder = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        self.project = Project.objects.create(title='Project', description='Description', user=self.owner,
+                                              start_date=date.today(), end_date=date.today())
+        JobOffer.objects.create(project=self.project, user=self.coder, money=100, hours=10, message='Offer',
+                                accepted=True)
+
+    def pending(self, user):
+        return ProjectScore.get_cached_num_pending_scores_for_user(user)
+
+    def test_counts_are_invalidated_when_scores_change(self):
+        self.assertEqual((self.pending(self.owner), self.pending(self.coder)), (0, 0))
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse('close_project', kwargs={'pk': self.project.pk}))
+        self.assertEqual((self.pending(self.owner), self.pending(self.coder)), (1, 1))
+
+        score = ProjectScore.objects.select_related('project').get()
+        score.set_coder_score(4)
+        self.assertEqual((self.pending(self.owner), self.pending(self.coder)), (0, 1))
+        score.set_owner_score(5)
+        self.assertEqual((self.pending(self.owner), self.pending(self.coder)), (0, 0))
+
+    def test_cached_count_is_reused(self):
+        self.pending(self.coder)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.pending(self.coder), 0)
+
+    def test_badge_is_only_counted_by_pages_that_show_it(self):
+        request = RequestFactory().get('/')
+        request.user = self.coder
+        with self.assertNumQueries(0):
+            context = processor(request)
+        self.assertEqual(context['num_pending_scores'](), 0)
+
+
+class CachedUserTests(TransactionTestCase):
+    # the cached user is dropped when the transaction commits
+
+    def setUp(self):
+        cache.clear()
+
+    def test_password_change_ends_the_other_sessions(self):
+        user = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('my_profile')).status_code, 200)
+        self.assertIsNotNone(cache.get(User._cached_user_key(user.pk)))
+
+        user.set_password('new password')
+        user.save()
+        self.assertIsNone(cache.get(User._cached_user_key(user.pk)))
+        response = self.client.get(reverse('my_profile'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(settings.LOGIN_URL))
+
+    def test_deleted_users_are_not_served(self):
+        user = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        self.client.force_login(user)
+        self.client.get(reverse('my_profile'))
+
+        user.deleted = True
+        user.save()
+        self.assertEqual(self.client.get(reverse('my_profile')).status_code, 302)
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def consume_at(self, buckets, clock, now):
+        with mock.patch('rentacoder_app.throttling.time.' + clock, return_value=now):
+            return buckets.consume('key', 2, 10)
+
+    def assertRefillAndRejection(self, buckets, clock):
+        # a burst of two, then one token every 5 seconds
+        self.assertEqual(self.consume_at(buckets, clock, 100), 0)
+        self.assertEqual(self.consume_at(buckets, clock, 100), 0)
+        self.assertEqual(self.consume_at(buckets, clock, 100), 5)
+        self.assertEqual(self.consume_at(buckets, clock, 102), 3)
+        self.assertEqual(self.consume_at(buckets, clock, 105), 0)
+        self.assertEqual(self.consume_at(buckets, clock, 105), 5)
+        # idle for longer than the period, the bucket holds at most a burst
+        self.assertEqual(self.consume_at(buckets, clock, 200), 0)
+        self.assertEqual(self.consume_at(buckets, clock, 200), 0)
+        self.assertEqual(self.consume_at(buckets, clock, 200), 5)
+
+    def test_local_buckets(self):
+        self.assertRefillAndRejection(LocalBuckets(), 'monotonic')
+
+    def test_cache_buckets(self):
+        self.assertRefillAndRejection(CacheBuckets(), 'time')
+
+    def test_local_buckets_forget_least_recently_used(self):
+        buckets = LocalBuckets(max_buckets=2)
+        for key in ('a', 'b', 'c'):
+            buckets.consume(key, 1, 10)
+        self.assertEqual(list(buckets.buckets), ['b', 'c'])
+
+
+@override_settings(THROTTLE_BACKEND='local', THROTTLE_RATES={'register': (1, 60)})
+class ThrottleMiddlewareTests(TestCase):
+
+    def post(self, forwarded_for):
+        return self.client.post(reverse('register'), {}, HTTP_X_FORWARDED_FOR=forwarded_for)
+
+    def test_rejected_with_retry_after(self):
+        self.assertNotEqual(self.post('10.0.0.1').status_code, 429)
+        response = self.post('10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+
+    def test_other_views_not_throttled(self):
+        for _ in range(3):
+            self.assertNotEqual(self.client.post(reverse('login'), {}).status_code, 429)
+
+    def test_forwarded_for_ignored_by_default(self):
+        self.post('10.0.0.1')
+        # a forged header does not get a new bucket, the request comes from the same address
+        self.assertEqual(self.post('10.0.0.2').status_code, 429)
+
+    @override_settings(THROTTLE_TRUST_FORWARDED_FOR=True)
+    def test_forwarded_for_trusted_behind_proxy(self):
+        self.post('10.0.0.1')
+        self.assertNotEqual(self.post('10.0.0.2').status_code, 429)
+        self.assertEqual(self.post('10.0.0.1, 10.0.0.9').status_code, 429)
+
+
+class NotificationDigestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password', is_active=True,
+                                             notification_frequency=User.NOTIFY_DAILY)
+        cls.coder = User.objects.create_user('coder', 'coder@example.com', 'password', is_active=True)
+        start = date.today()
+        cls.project = Project.objects.create(title='Project', description='Description', user=cls.owner,
+                                             start_date=start, end_date=start)
+
+    def test_events_sent_in_the_digest_of_the_owner_frequency(self):
+        NotificationEvent.notify_owner(email_manager.CODER_APPLIED_TO_PROJECT, self.project, self.coder)
+        self.assertEqual(NotificationEvent.send_digests(User.NOTIFY_HOURLY), (0, 0))
+        self.assertEqual(NotificationEvent.send_digests(User.NOTIFY_DAILY), (1, 1))
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(QueuedEmail.objects.get().recipient, self.owner.email)
+
+    def test_events_recorded_before_switching_to_immediate_are_sent(self):
+        NotificationEvent.notify_owner(email_manager.CODER_APPLIED_TO_PROJECT, self.project, self.coder)
+        User.objects.filter(pk=self.owner.pk).update(notification_frequency=User.NOTIFY_IMMEDIATELY)
+
+        self.assertEqual(NotificationEvent.send_digests(User.NOTIFY_HOURLY), (1, 1))
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(QueuedEmail.objects.get().notification, email_manager.DIGEST)
+
+
+class NotificationRendererTests(TestCase):
+
+    def setUp(self):
+        email_manager.EmailManager.templates.clear()
+        self.project = Project(pk=1, title='Shop', description='Description')
+
+    def notify(self, recipients):
+        email_manager.EmailManager.notify(email_manager.PROJECT_CLOSED,
+                                          {'project': self.project, 'scores_url': 'http://example.com/scores/'},
+                                          recipients)
+
+    def test_each_recipient_gets_its_own_context(self):
+        self.notify([('accepted@example.com', {'user_name': 'ana', 'accepted': True}),
+                     ('rejected@example.com', {'user_name': 'bob', 'accepted': False})])
+
+        accepted, rejected = QueuedEmail.objects.order_by('id')
+        self.assertEqual((accepted.recipient, accepted.subject, accepted.notification),
+                         ('accepted@example.com', 'Project Shop closed!', email_manager.PROJECT_CLOSED))
+        self.assertIn('Dear ana', accepted.html_message)
+        self.assertIn('rate the project owner at http://example.com/scores/', accepted.html_message)
+        self.assertEqual(rejected.subject, 'Project Shop closed!')
+        self.assertIn('Dear bob', rejected.html_message)
+        self.assertIn('You were not accepted', rejected.html_message)
+
+    def test_template_is_compiled_once(self):
+        with mock.patch('rentacoder_app.email_manager.loader.get_template',
+                        wraps=email_manager.loader.get_template) as get_template:
+            self.notify([('one@example.com', {'user_name': 'one', 'accepted': True})])
+            self.notify([('two@example.com', {'user_name': 'two', 'accepted': True})])
+        self.assertEqual(get_template.call_count, 1)
+        self.assertEqual(QueuedEmail.objects.count(), 2)
+
+    def test_all_recipients_are_queued_with_one_insert(self):
+        recipients = [('coder{}@example.com'.format(number), {'user_name': 'coder', 'accepted': False})
+                      for number in range(20)]
+        with self.assertNumQueries(1):
+            self.notify(recipients)
+
+
+class FakeSMTPConnection:
+    """
+    Email backend connection that records what it sends and fails for some recipients
+    """
+
+    def __init__(self, failing, sent):
+        self.failing = failing
+        self.sent = sent
+        self.opened = 0
+        self.is_open = False
+
+    def open(self):
+        if not self.is_open:
+            self.is_open = True
+            self.opened += 1
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        recipient = messages[0].to[0]
+        if recipient in self.failing:
+            raise IOError('Recipient refused')
+        self.sent.append(recipient)
+
+
+class SendMessagesTests(SimpleTestCase):
+
+    def send(self, recipients, failing, chunk_size):
+        sent = []
+        connections = []
+
+        def get_connection(**kwargs):
+            connections.append(FakeSMTPConnection(failing, sent))
+            return connections[-1]
+
+        messages = [(email_manager.PROJECT_CLOSED, EmailMultiAlternatives('Subject', '', to=(recipient,)))
+                    for recipient in recipients]
+        with mock.patch('rentacoder_app.email_manager.get_connection', side_effect=get_connection):
+            errors = email_manager.EmailManager.send_messages(messages, chunk_size=chunk_size)
+        return errors, sent, connections
+
+    def test_one_connection_per_chunk(self):
+        recipients = ['coder{}@example.com'.format(number) for number in range(5)]
+        errors, sent, connections = self.send(recipients, (), chunk_size=2)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(sent, recipients)
+        self.assertEqual([connection.opened for connection in connections], [1, 1, 1])
+        self.assertFalse(any(connection.is_open for connection in connections))
+
+    def test_failed_message_does_not_abort_its_chunk(self):
+        recipients = ['first@example.com', 'refused@example.com', 'third@example.com']
+        errors, sent, connections = self.send(recipients, ('refused@example.com',), chunk_size=10)
+        self.assertEqual(sent, ['first@example.com', 'third@example.com'])
+        self.assertEqual([error is None for error in errors], [True, False, True])
+        # the failure closed the connection, the next message reconnected
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(connections[0].opened, 2)
+
+
+class EmailQueueTests(TransactionTestCase):
+
+    def queue(self, recipient):
+        return QueuedEmail.objects.create(recipient=recipient, subject='Subject', html_message='<p>Message</p>')
+
+    def test_emails_are_sent_outside_the_claim_transaction(self):
+        sent = self.queue('sent@example.com')
+        failed = self.queue('failed@example.com')
+
+        def send_messages(messages):
+            # claimed and committed, the other workers skip them until the lease ends
+            self.assertFalse(connection.in_atomic_block)
+            self.assertFalse(QueuedEmail.objects.filter(next_attempt__lte=timezone.now()).exists())
+            return [None, IOError('Mailbox unavailable')]
+
+        with mock.patch.object(email_manager.EmailManager, 'send_messages', side_effect=send_messages):
+            self.assertEqual(QueuedEmail.deliver_batch(10, 5), (1, 1, 0))
+
+        sent.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((sent.status, sent.attempts), (QueuedEmail.STATUS_SENT, 1))
+        self.assertEqual((failed.status, failed.attempts, failed.last_error),
+                         (QueuedEmail.STATUS_PENDING, 1, 'Mailbox unavailable'))
+        self.assertGreater(failed.next_attempt, timezone.now())
+
+    def test_emails_of_a_crashed_worker_are_counted(self):
+        email = self.queue('crash@example.com')
+        with mock.patch.object(email_manager.EmailManager, 'send_messages', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                QueuedEmail.deliver_batch(10, 5)
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (QueuedEmail.STATUS_PENDING, 1))
+        self.assertEqual(QueuedEmail.deliver_batch(10, 5), (0, 0, 0))
+
+
+class PurgeExpiredTests(TestCase):
+
+    def setUp(self):
+        long_ago = timezone.now() - const.ABANDONED_ACCOUNT_AGE - timedelta(days=1)
+        self.abandoned = [self.create_user('abandoned{}'.format(number), date_joined=long_ago) for number in range(3)]
+        self.pending = self.create_user('pending')
+        self.active = self.create_user('active', is_active=True, date_joined=long_ago, last_login=long_ago)
+        self.expired_token = EmailToken.objects.create(user=self.active)
+        EmailToken.objects.filter(pk=self.expired_token.pk).update(expiry_date=timezone.now() - timedelta(days=1))
+        self.valid_token = EmailToken.objects.create(user=self.pending)
+        ResetPasswordToken.objects.create(user=self.active)
+        ResetPasswordToken.objects.update(expiry_date=timezone.now() - timedelta(days=1))
+
+    def create_user(self, username, **fields):
+        user = User.objects.create_user(username, username + '@example.com', 'password')
+        User.objects.filter(pk=user.pk).update(**fields)
+        return user
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_expired', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_purge(self):
+        output = self.purge()
+        self.assertIn('Email tokens: 1 deleted', output)
+        self.assertIn('Reset password tokens: 1 deleted', output)
+        self.assertIn('Abandoned accounts: 3 deleted', output)
+        self.assertEqual(set(User.objects.values_list('username', flat=True)), {'pending', 'active'})
+        self.assertEqual(list(EmailToken.objects.all()), [self.valid_token])
+        self.assertFalse(ResetPasswordToken.objects.exists())
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.purge('--dry-run')
+        self.assertIn('Abandoned accounts: 3 would be deleted', output)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(EmailToken.objects.count(), 2)
+
+
+class GenerateDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', users=20, technologies=8, projects=60, offers=3, questions=2,
+                     batch_size=7, stdout=StringIO())
+
+    def test_rows_are_created(self):
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Technology.objects.count(), 8)
+        self.assertEqual(Project.objects.count(), 60)
+        self.assertTrue(JobOffer.objects.exists())
+        self.assertTrue(ProjectQuestion.objects.exists())
+        self.assertTrue(ProjectScore.objects.exists())
+
+    def test_denormalized_values_match_the_rows(self):
+        counters = list(Project.objects.order_by('id').values_list('offers_count', 'accepted_count', 'questions_count'))
+        Project.repair_counters(Project.objects.all())
+        self.assertEqual(
+            list(Project.objects.order_by('id').values_list('offers_count', 'accepted_count', 'questions_count')),
+            counters)
+
+        for technology in Technology.objects.select_related('counter'):
+            self.assertEqual(technology.counter.open_projects, technology.project_set.filter(closed=False).count())
+
+        fields = User.REPUTATION_FIELDS
+        reputation = list(User.objects.order_by('id').values_list(*fields))
+        User.recompute_reputation(User.objects.all())
+        self.assertEqual(list(User.objects.order_by('id').values_list(*fields)), reputation)
+
+    def test_offers_are_consistent(self):
+        self.assertFalse(JobOffer.objects.filter(user=F('project__user')).exists())
+        for project in Project.objects.filter(accepted_count__gt=0):
+            self.assertLessEqual(project.accepted_count, project.openings)
+        # only accepted coders of closed projects are scored
+        self.assertFalse(ProjectScore.objects.filter(project__closed=False).exists())
+
+    def test_generated_projects_are_searchable(self):
+        project = Project.objects.order_by('id').first()
+        word = get_terms(project.title)[-1]
+        self.assertIn(project, search_projects(Project.objects.all(), word))
+
+    def test_sequences_continue_after_the_generated_ids(self):
+        user = User.objects.create_user('new', 'new@example.com', 'password')
+        project = Project.objects.create(title='New', description='Description', user=user,
+                                         start_date=date.today(), end_date=date.today())
+        self.assertGreater(user.pk, 20)
+        self.assertGreater(project.pk, 60)
+
+
+class AvatarVariantTests(TransactionTestCase):
+    # resize_avatars closes the connection before starting its workers
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def save_image(self, name, color, image_format):
+        content = BytesIO()
+        Image.new('RGB', (300, 300), color).save(content, image_format)
+        return default_storage.save(name, ContentFile(content.getvalue()))
+
+    def variant_color(self, name, size):
+        with default_storage.open(variant_name(name, size)) as variant:
+            return Image.open(variant).convert('RGB').getpixel((size // 2, size // 2))
+
+    def test_avatars_with_the_same_root_keep_their_variants(self):
+        png = self.save_image('avatars/me.png', (255, 0, 0), 'PNG')
+        jpg = self.save_image('avatars/me.jpg', (0, 0, 255), 'JPEG')
+        create_variants(png)
+        create_variants(jpg)
+
+        self.assertNotEqual(variant_name(png, 64), variant_name(jpg, 64))
+        self.assertGreater(self.variant_color(png, 64)[0], 200)
+        self.assertGreater(self.variant_color(jpg, 64)[2], 200)
+
+    def test_new_users_get_the_default_avatar_variants(self):
+        self.save_image(const.DEFAULT_PROFILE_IMAGE_USER, (0, 255, 0), 'JPEG')
+        # run on deploy
+        call_command('resize_avatars', processes=1, stdout=StringIO())
+
+        user = User.objects.create_user('new', 'new@example.com', 'password')
+        self.assertTrue(user.avatar_resized)
+        self.assertEqual(avatar_url(user, 64), default_storage.url(variant_name(const.DEFAULT_PROFILE_IMAGE_USER, 64)))
+        self.assertTrue(default_storage.exists(variant_name(const.DEFAULT_PROFILE_IMAGE_USER, 64)))
+
+
+@override_settings(ATTACHMENT_SENDFILE=None)
+class ServeFileTests(SimpleTestCase):
+
+    def setUp(self):
+        file = tempfile.NamedTemporaryFile(delete=False)
+        file.write(b'\x1f\x8b attachment')
+        file.close()
+        self.path = file.name
+        self.addCleanup(os.remove, self.path)
+
+    def serve(self, filename):
+        response = serve_file(RequestFactory().get('/'), self.path, filename)
+        response.close()
+        return response
+
+    def test_compressed_attachments_are_not_content_encoded(self):
+        response = self.serve('backup.tar.gz')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+
+    def test_ascii_names_are_quoted(self):
+        response = self.serve('spec "v2".pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="spec v2.pdf"')
+
+    def test_non_ascii_names_get_an_rfc_5987_name(self):
+        response = self.serve('diseño\\\r\nfinal.pdf')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="disenofinal.pdf"; filename*=UTF-8\'\'dise%C3%B1ofinal.pdf')
+
+
+class StaticServingTests(SimpleTestCase):
+
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        settings_override = self.settings(STATIC_ROOT=static_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name, content in (('css/base.55e7cbb9ba48.css', b'body {}'), ('css/base.55e7cbb9ba48.css.gz', b'gz'),
+                              ('css/base.55e7cbb9ba48.css.br', b'br'), ('robots.txt', b'User-agent: *')):
+            os.makedirs(os.path.join(static_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(static_root, name), 'wb') as file:
+                file.write(content)
+
+    def serve(self, path, accept_encoding=''):
+        response = static_serving.serve(RequestFactory().get('/static/' + path, HTTP_ACCEPT_ENCODING=accept_encoding),
+                                        path)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        response.close()
+        return response, content
+
+    def test_precompressed_variant_by_preference(self):
+        response, content = self.serve('css/base.55e7cbb9ba48.css', 'gzip, br')
+        self.assertEqual((content, response['Content-Encoding']), (b'br', 'br'))
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response, content = self.serve('css/base.55e7cbb9ba48.css', 'gzip, br;q=0')
+        self.assertEqual((content, response['Content-Encoding']), (b'gz', 'gzip'))
+
+        response, content = self.serve('css/base.55e7cbb9ba48.css')
+        self.assertEqual(content, b'body {}')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_hashed_names_are_cached_for_a_year(self):
+        response, _ = self.serve('css/base.55e7cbb9ba48.css')
+        self.assertIn('max-age={}, immutable'.format(const.STATIC_HASHED_MAX_AGE), response['Cache-Control'])
+        response, _ = self.serve('robots.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age={}'.format(const.STATIC_MAX_AGE))
+
+    def test_revalidation(self):
+        response, _ = self.serve('robots.txt')
+        request = RequestFactory().get('/static/robots.txt', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(static_serving.serve(request, 'robots.txt').status_code, 304)
+
+    def test_files_outside_the_static_root(self):
+        for path in ('../secret.txt', 'css/missing.css'):
+            with self.assertRaises(Http404, msg=path):
+                self.serve(path)
+
+
+class BuildStaticTests(SimpleTestCase):
+
+    def test_collects_hashed_names_and_compressed_variants(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        with self.settings(STATIC_ROOT=static_root,
+                           STATICFILES_STORAGE='django.contrib.staticfiles.storage.ManifestStaticFilesStorage'):
+            call_command('build_static', verbosity=0, stdout=StringIO(), stderr=StringIO())
+            with open(os.path.join(static_root, 'staticfiles.json')) as manifest:
+                hashed_names = list(json.load(manifest)['paths'].values())
+
+        compressible = [name for name in hashed_names
+                        if os.path.splitext(name)[1] in const.STATIC_COMPRESSED_EXTENSIONS]
+        self.assertTrue(compressible)
+        for name in compressible:
+            path = os.path.join(static_root, name)
+            self.assertTrue(HASHED_NAME_RE.search(name), name)
+            if os.path.exists(path + '.gz'):
+                with open(path, 'rb') as original, gzip.open(path + '.gz') as variant:
+                    self.assertEqual(variant.read(), original.read())
+        self.assertTrue(any(os.path.exists(os.path.join(static_root, name + '.gz')) for name in compressible))
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        for name in ('avatars/me.png', 'blobs/ab/abcd', 'files/spec.pdf'):
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as file:
+                file.write(b'content')
+
+    def serve(self, path):
+        response = serve_media(RequestFactory().get('/media/' + path), path, document_root=self.media_root)
+        response.close()
+        return response
+
+    def test_avatars_are_served(self):
+        self.assertEqual(self.serve('avatars/me.png').status_code, 200)
+
+    def test_attachments_are_not_served(self):
+        for path in ('blobs/ab/abcd', 'files/spec.pdf', 'avatars/../blobs/ab/abcd', '/files/spec.pdf',
+                     'avatars/%2e%2e/files/spec.pdf'):
+            with self.assertRaises(Http404, msg=path):
+                self.serve(path)
+
+
+class BlobReleaseTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def create_project(self, content):
+        project = Project(title='Project', description='Description', user=self.owner,
+                          start_date=date.today(), end_date=date.today() + timedelta(days=30))
+        project.file.save('spec.txt', ContentFile(content), save=False)
+        project.save()
+        return project
+
+    def refcount(self):
+        return Blob.objects.get().refcount
+
+    def test_deleting_a_project_releases_its_blob(self):
+        project = self.create_project(b'spec')
+        self.create_project(b'spec')
+        self.assertEqual(self.refcount(), 2)
+        project.delete()
+        self.assertEqual(self.refcount(), 1)
+
+    def test_queryset_delete_releases_the_blobs(self):
+        self.create_project(b'spec')
+        self.create_project(b'spec')
+        Project.objects.all().delete()
+        self.assertEqual(self.refcount(), 0)
+
+    def test_deleting_the_owner_releases_the_blobs(self):
+        self.create_project(b'spec')
+        self.owner.delete()
+        self.assertEqual(self.refcount(), 0)
+
+
+class ExportTests(TestCase):
+
+    def test_rows_are_streamed_in_chunks_of_ids(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        Project.objects.bulk_create(
+            Project(title='Project {}'.format(number), description='Description', user=owner,
+                    start_date=date.today(), end_date=date.today()) for number in range(5))
+
+        with mock.patch.object(const, 'EXPORT_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = stream_export('projects', 'jsonl', owner=owner.pk)
+            lines = b''.join(response.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(len(queries), 3)
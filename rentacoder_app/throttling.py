@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+import rentacoder_app.constants as const
+
+log = logging.getLogger(__name__)
+
+LOCAL = 'local'
+CACHE = 'cache'
+
+
+def _refill(tokens, updated, now, capacity, period):
+    """
+    Adds the tokens earned since the last update, a bucket refills completely in period seconds
+    :return float: Tokens in the bucket
+    """
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+
+def _take(tokens, capacity, period):
+    """
+    Takes a token from a bucket
+    :return: Tokens left, seconds to wait for the next token or 0 if the token was taken
+    """
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) * period / capacity
+
+
+class LocalBuckets:
+    """
+    Token buckets kept in the memory of the process, each worker enforces the limits on its own
+    """
+
+    def __init__(self, max_buckets=const.THROTTLE_LOCAL_MAX_BUCKETS):
+        self.buckets = OrderedDict()
+        self.max_buckets = max_buckets
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        """
+        Takes a token from the bucket of key
+        :param str key: Bucket key
+        :param int capacity: Maximum tokens, the size of a burst
+        :param int period: Seconds to refill the bucket completely
+        :return: Seconds to wait for the next token or 0 if the token was taken
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens, wait = _take(_refill(tokens, updated, now, capacity, period), capacity, period)
+            self.buckets[key] = (tokens, now)
+            # forget the least recently used buckets, they were refilled by now most of the time
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBuckets:
+    """
+    Token buckets kept in the default cache so every worker shares the limits. The read and the write of a
+    bucket are not atomic, concurrent requests can take a few extra tokens
+    """
+
+    def consume(self, key, capacity, period):
+        """
+        Takes a token from the bucket of key, see LocalBuckets.consume
+        """
+        now = time.time()
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens, wait = _take(_refill(tokens, updated, now, capacity, period), capacity, period)
+        # a bucket untouched for a whole period is full again, the entry can expire
+        cache.set(key, (tokens, now), period)
+        return wait
+
+
+BUCKETS = {
+    LOCAL: LocalBuckets,
+    CACHE: CacheBuckets,
+}
+
+
+def get_client_ip(request):
+    """
+    Gets the address of the client, the X-Forwarded-For header is only used when THROTTLE_TRUST_FORWARDED_FOR
+    is set because clients can forge it when the app is not behind a proxy
+    :param request: Django request object
+    :return str: Client address
+    """
+    if settings.THROTTLE_TRUST_FORWARDED_FOR:
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class ThrottleMiddleware:
+    """
+    Limits the POST requests to the views in THROTTLE_RATES with a token bucket per client address and per
+    user. Rejected requests get a 429 response before reaching the view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.buckets = BUCKETS[settings.THROTTLE_BACKEND]()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST':
+            return None
+        url_name = request.resolver_match.url_name
+        rate = settings.THROTTLE_RATES.get(url_name)
+        if rate is None:
+            return None
+
+        capacity, period = rate
+        keys = ['ip:' + get_client_ip(request)]
+        if request.user.is_authenticated():
+            keys.append('user:{}'.format(request.user.pk))
+        for key in keys:
+            wait = self.buckets.consume('throttle:{}:{}'.format(url_name, key), capacity, period)
+            if wait:
+                log.warning('Throttled %s request by %s' % (url_name, key))
+                response = HttpResponse('Too many requests, try again later.', status=429,
+                                        content_type='text/plain')
+                response['Retry-After'] = str(int(wait) + 1)
+                return response
+        return None
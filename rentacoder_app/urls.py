@@ -4,6 +4,7 @@ from django.contrib.auth import views as auth_views
 from django.conf.urls import url
 
 from . import views
+from .downloads import serve_media
 
 urlpatterns = [
     url(r'^login/$', auth_views.login, {'template_name': 'views/login.html'}, name='login'),
@@ -19,8 +20,10 @@ urlpatterns = [
     url(r'^$', views.portal, name='portal'),
     url(r'^projects/$', views.my_projects, name='my_projects'),
     url(r'^projects/new/$', views.new_project, name='new_project'),
+    url(r'^projects/search/$', views.search, name='search'),
     url(r'^projects/(?P<pk>[0-9]+)/$', views.project, name='project'),
     url(r'^projects/(?P<pk>[0-9]+)/apply/$', views.apply_to_project, name='apply'),
+    url(r'^projects/(?P<pk>[0-9]+)/attachment/$', views.download_attachment, name='project_attachment'),
     url(r'^projects/(?P<pk>[0-9]+)/edit/$', views.edit_project, name='edit'),
     url(r'^projects/(?P<pk>[0-9]+)/questions/$', views.send_question, name='send_question'),
     url(r'^projects/(?P<pk>[0-9]+)/questions/(?P<question_id>[0-9]+)$', views.answer_question, name='answer_question'),
@@ -33,6 +36,8 @@ urlpatterns = [
     url(r'^scores/owner/(?P<pk>[0-9]+)$', views.score_owner, name='score_owner'),
 
     url(r'^history/$', views.history, name='history'),
+
+    url(r'^export/(?P<name>projects|offers|scores)\.(?P<export_format>csv|jsonl)$', views.export, name='export'),
     url(r'^projects/(?P<pk>[0-9]+)/close/$', views.close_project, name='close_project'),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+] + static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
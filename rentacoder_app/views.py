@@ -1,20 +1,30 @@
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
-from django.http import HttpResponse, HttpResponseForbidden
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseBadRequest
 from django.template import loader
 
 import logging
 
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Prefetch
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 
 from .forms import ResetPasswordForm, RegisterForm, NewProjectForm, ApplyToProjectForm, UserProfileForm, \
-    ProjectQuestionForm, AnswerQuestionForm, ScoreForm
-from .models import User, Project, Technology, ProjectQuestion, JobOffer, ProjectScore
+    ProjectQuestionForm, AnswerQuestionForm, ScoreForm, TechnologyFilterForm, SearchForm, ExportFilterForm
+from .models import User, Project, Technology, TechnologyCounter, ProjectQuestion, JobOffer, ProjectScore, \
+    NotificationEvent
+from . import email_manager
+from .downloads import serve_file
+from .email_manager import EmailManager
+from .export import stream_export
+from .fragment_cache import get_fragment, get_fragments, params_key
+from .pagination import paginate, paginate_by_offset, is_leading_page
+from .replicas import use_replica
+from .search import index_projects, search_projects
 from .views_helper import verify_registration_token
+import rentacoder_app.constants as const
 import rentacoder_app.errors as err
 
 log = logging.getLogger(__name__)
@@ -23,39 +33,70 @@ GET = 'GET'
 POST = 'POST'
 
 
+def render_project_card(project):
+    return loader.render_to_string('views/project_card.html', {'project': project})
+
+
+def render_project_listing(projects_last):
+    """
+    Renders the portal listing, the project cards are reused from the fragment cache
+    :param projects_last: Page of projects
+    :return str: Rendered listing
+    """
+    cards = get_fragments(projects_last, lambda project: 'portal:card:{}'.format(project.pk), render_project_card)
+    return loader.render_to_string('views/portal_listing.html', {'projectsLast': projects_last, 'cards': cards})
+
+
 @login_required
+@use_replica
 def portal(request):
-    projects_last_all = Project.objects.filter(closed=False).order_by('-id')
-    page = request.GET.get('page', 1)
+    filter_form = TechnologyFilterForm(request.GET)
 
-    paginator_last = Paginator(projects_last_all, 5)
-    try:
-        projects_last = paginator_last.page(page)
-    except PageNotAnInteger:
-        projects_last = paginator_last.page(1)
-    except EmptyPage:
-        projects_last = paginator_last.page(paginator_last.num_pages)
+    def build_listing():
+        projects_last_all = filter_form.filter(
+            Project.objects.filter(closed=False).select_related('user').order_by('-id'))
+        return render_project_listing(paginate(projects_last_all, request.GET, const.PROJECTS_PER_PAGE))
+
+    # the first pages are the most requested ones, cache them as a whole
+    if is_leading_page(request.GET, const.CACHED_LISTING_PAGES):
+        listing = get_fragment(params_key('portal:listing', request.GET), build_listing)
+    else:
+        listing = build_listing()
 
     context = {
-        "projectsLast": projects_last
+        "listing": listing,
+        "filter_form": filter_form,
     }
     return render(request, 'views/portal.html', context)
 
 
+@login_required
+def search(request):
+    form = SearchForm(request.GET or None)
+    projects = Project.objects.order_by('-id').none()
+    if form.is_valid():
+        projects = Project.objects.order_by('-id')
+        if not form.cleaned_data.get('include_closed'):
+            projects = projects.filter(closed=False)
+        projects = search_projects(projects, form.cleaned_data.get('q'))
+
+    # keep the search params in the pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
+    context = {
+        "form": form,
+        "results": paginate_by_offset(projects, request.GET.get('page', 1), const.PROJECTS_PER_PAGE),
+        "search_params": params.urlencode(),
+    }
+    return render(request, 'views/search.html', context)
+
+
 @login_required
 def my_projects(request):
     projects = Project.objects.filter(user=request.user)
     active_projects = projects.filter(closed=False).order_by('-id')
     closed_projects = projects.filter(closed=True).order_by('-id')
-    page = request.GET.get('page', 1)
-
-    paginator = Paginator(active_projects, 5)
-    try:
-        active_projects = paginator.page(page)
-    except PageNotAnInteger:
-        active_projects = paginator.page(1)
-    except EmptyPage:
-        active_projects = paginator.page(paginator.num_pages)
+    active_projects = paginate(active_projects, request.GET, const.PROJECTS_PER_PAGE)
 
     context = {
         "active_projects": active_projects,
@@ -90,6 +131,7 @@ def my_profile(request):
 
 
 @login_required
+@use_replica
 def user_profile(request, pk):
     user = User.objects.get(pk=pk)
 
@@ -119,11 +161,14 @@ def new_project(request):
             form.user_id = request.user.pk
             project = form.save(commit=False)
             project.user_id = request.user.pk
-            project.save()
+            with transaction.atomic():
+                project.save()
 
-            for tech_name in technologies:
-                technology = Technology.objects.get(name=tech_name)
-                project.technologies.add(technology)
+                for tech_name in technologies:
+                    technology = Technology.objects.get(name=tech_name)
+                    project.technologies.add(technology)
+                TechnologyCounter.update_counts(project.technologies.values_list('id', flat=True), 1)
+                index_projects([project])
 
             return redirect(reverse('project', kwargs={"pk": project.pk}))
         else:
@@ -134,28 +179,47 @@ def new_project(request):
 
 
 @login_required
+@use_replica
 def project(request, pk):
-    project = get_object_or_404(Project, pk=pk)
+    # a single prefetch pass loads everything the page shows, flags and counts are computed in python
+    project = get_object_or_404(
+        Project.objects.select_related('user').prefetch_related(
+            Prefetch('joboffer_set', queryset=JobOffer.objects.select_related('user').order_by('id')),
+            Prefetch('projectquestion_set', queryset=ProjectQuestion.objects.select_related('user').order_by('id')),
+            'technologies',
+        ),
+        pk=pk
+    )
     job_offers = project.joboffer_set.all()
+    own_offer = next((offer for offer in job_offers if offer.user_id == request.user.pk), None)
     context = {
         "project": project,
         "job_offers": job_offers,
-        "openings_available": project.openings - len(job_offers.filter(accepted=True)),
-        "technologies": list(project.technologies.all().values_list("name", flat=True)),
+        "openings_available": project.openings - project.accepted_count,
+        "technologies": [technology.name for technology in project.technologies.all()],
         "questions": project.projectquestion_set.all(),  # TODO: Private questions, private answers
         "question_form": ProjectQuestionForm(),
         "answer_form": AnswerQuestionForm(),
-        "already_applied": job_offers.filter(user=request.user).exists(),
-        "accepted": job_offers.filter(user=request.user, accepted=True).exists(),
+        "already_applied": own_offer is not None,
+        "accepted": own_offer is not None and own_offer.accepted,
     }
-    try:
-        if project.file:
-            context["file_name"] = project.file.name.split("files/")[1]
-    except:
-        log.error("Problem getting file '{}'".format(project.file.name))
+    if project.file:
+        context["file_name"] = project.get_file_name()
     return render(request, 'views/project.html', context)
 
 
+@login_required
+def download_attachment(request, pk):
+    project = get_object_or_404(Project, pk=pk)
+    if not project.file:
+        raise Http404
+    try:
+        return serve_file(request, project.file.path, project.get_file_name())
+    except FileNotFoundError:
+        log.error("Attachment '{}' of project {} is missing".format(project.file.name, pk))
+        raise Http404
+
+
 @login_required
 def edit_project(request, pk):
     project = get_object_or_404(Project, pk=pk)
@@ -171,7 +235,14 @@ def edit_project(request, pk):
         return render(request, 'views/edit_project.html', context)
     else:
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                old_technologies = set(project.technologies.values_list('id', flat=True))
+                form.save()
+                if not project.closed:
+                    new_technologies = set(technology.pk for technology in form.cleaned_data['technologies'])
+                    TechnologyCounter.update_counts(new_technologies - old_technologies, 1)
+                    TechnologyCounter.update_counts(old_technologies - new_technologies, -1)
+                index_projects([project])
             return redirect(reverse('project', kwargs={"pk": pk}))
         else:
             log.error("Invalid form data: {}".format(form.errors.as_json()))
@@ -206,54 +277,18 @@ def apply_to_project(request, pk):
                 job_offer = form.save(commit=False)
                 job_offer.user_id = request.user.pk
                 job_offer.project_id = pk
-                job_offer.save()
+                project = Project.objects.select_related('user').get(pk=pk)
+                with transaction.atomic():
+                    job_offer.save()
+                    Project.update_counters(pk, offers_count=1)
+
+                    # Queue mail to user, the owner is notified right away or in their digest
+                    EmailManager.notify(email_manager.YOU_APPLIED_TO_PROJECT,
+                                        {'project': project, 'project_url': project.get_url()},
+                                        [(request.user.email, {'user_name': request.user.username})])
+                    NotificationEvent.notify_owner(email_manager.CODER_APPLIED_TO_PROJECT, project, request.user)
                 log.info("User {} is now an applicant for Proyect {}".format(request.user, pk))
 
-                # Send mail to user
-                project = Project.objects.get(pk=pk)
-                html_message = loader.render_to_string(
-                    'email/you_applied_to_project.html',
-                    {
-                        'user_name': request.user.username,
-                        'project': project,
-                        'project_url': project.get_url()
-                    }
-                )
-                try:
-                    send_mail(
-                        subject="Applied to Project {}!".format(project.title),
-                        message='',
-                        from_email='',
-                        recipient_list=(request.user.email,),
-                        fail_silently=False,
-                        html_message=html_message
-                    )
-                except Exception as e:
-                    log.exception("Problem sending email: {}".format(e))
-
-                # Send mail to owner
-                html_message = loader.render_to_string(
-                    'email/coder_applied_to_project.html',
-                    {
-                        'user_name': project.user.username,
-                        'coder_name': request.user.username,
-                        'project': project,
-                        'project_url': project.get_url()
-                    }
-                )
-                try:
-                    send_mail(
-                        subject="Coder Applied to Project {}!".format(project.title),
-                        message='',
-                        from_email='',
-                        recipient_list=(project.user.email,),
-                        fail_silently=False,
-                        html_message=html_message
-                    )
-                except Exception as e:
-                    log.exception("Problem sending email: {}".format(e))
-
-
                 return redirect(reverse('project', kwargs={"pk": pk}))
         else:
             log.error("Invalid form data: {}".format(form.errors.as_json()))
@@ -273,30 +308,13 @@ def send_question(request, pk):
             question = form.save(commit=False)
             question.user_id = request.user.pk
             question.project_id = pk
-            question.save()
-
-            # Send mail to owner
-            project = Project.objects.get(pk=pk)
-            html_message = loader.render_to_string(
-                'email/question_asked.html',
-                {
-                    'user_name': project.user.username,
-                    'project': project,
-                    'project_url': project.get_url()
-                }
-            )
-            try:
-                send_mail(
-                    subject="Someone asked something in Project {}!".format(project.title),
-                    message='',
-                    from_email='',
-                    recipient_list=(project.user.email,),
-                    fail_silently=False,
-                    html_message=html_message
-                )
-            except Exception as e:
-                log.exception("Problem sending email: {}".format(e))
+            project = Project.objects.select_related('user').get(pk=pk)
+            with transaction.atomic():
+                question.save()
+                Project.update_counters(pk, questions_count=1)
 
+                # Notify the owner right away or in their digest
+                NotificationEvent.notify_owner(email_manager.QUESTION_ASKED, project)
 
             return redirect(reverse('project', kwargs={"pk": pk}))
         else:
@@ -311,31 +329,16 @@ def answer_question(request, pk, question_id):
                  format(question_id, pk, request.user, request.POST))
         form = AnswerQuestionForm(request.POST)
         if form.is_valid():
-            question = ProjectQuestion.objects.get(pk=question_id)
+            question = ProjectQuestion.objects.select_related('user').get(pk=question_id)
             question.answer = form.cleaned_data.get('answer')
-            question.save()
-
-            # Send mail to whoever asked the question
             project = Project.objects.get(pk=pk)
-            html_message = loader.render_to_string(
-                'email/question_answered.html',
-                {
-                    'user_name': question.user,
-                    'project': project,
-                    'project_url': project.get_url()
-                }
-            )
-            try:
-                send_mail(
-                    subject="Question answered for Project {}!".format(project.title),
-                    message='',
-                    from_email='',
-                    recipient_list=(question.user.email,),
-                    fail_silently=False,
-                    html_message=html_message
-                )
-            except Exception as e:
-                log.exception("Problem sending email: {}".format(e))
+            with transaction.atomic():
+                question.save()
+
+                # Queue mail to whoever asked the question
+                EmailManager.notify(email_manager.QUESTION_ANSWERED,
+                                    {'project': project, 'project_url': project.get_url()},
+                                    [(question.user.email, {'user_name': question.user})])
 
             return redirect(reverse('project', kwargs={"pk": pk}))
         else:
@@ -430,35 +433,22 @@ def accept_job_offer(request, pk, offer_id):
     if request.method == POST:
         log.info("Attempting to accept offer  {} for project {} by user {} - Request: {}".
                  format(offer_id, pk, request.user, request.POST))
-        offer = JobOffer.objects.get(pk=offer_id)
-        offer.accepted = True
-        offer.save()
-
-        # Send mail to user
+        offer = JobOffer.objects.select_related('user').get(pk=offer_id)
         project = Project.objects.get(pk=pk)
-        html_message = loader.render_to_string(
-            'email/application_accepted.html',
-            {
-                'user_name': offer.user.username,
-                'project': project,
-                'project_url': project.get_url()
-            }
-        )
-        try:
-            send_mail(
-                subject="Accepted in Project {}!".format(project.title),
-                message='',
-                from_email='',
-                recipient_list=(offer.user.email,),
-                fail_silently=False,
-                html_message=html_message
-            )
-        except Exception as e:
-            log.exception("Problem sending email: {}".format(e))
+        with transaction.atomic():
+            # only count the acceptance and notify once if the offer is accepted twice
+            if JobOffer.objects.filter(pk=offer.pk, accepted=False).update(accepted=True):
+                Project.update_counters(offer.project_id, accepted_count=1)
+
+                # Queue mail to user
+                EmailManager.notify(email_manager.APPLICATION_ACCEPTED,
+                                    {'project': project, 'project_url': project.get_url()},
+                                    [(offer.user.email, {'user_name': offer.user.username})])
 
         return redirect(reverse('project', kwargs={"pk": pk}))
 
 @login_required
+@use_replica
 def scores(request):
     context = {
         "pending_scores": ProjectScore.get_pending_scores_for_user(request.user),
@@ -469,6 +459,7 @@ def scores(request):
     return render(request, 'views/scores.html', context)
 
 @login_required
+@use_replica
 def applications(request):
     context = {
         "applications": JobOffer.objects.filter(user=request.user)
@@ -476,6 +467,7 @@ def applications(request):
     return render(request, 'views/my_applications.html', context)
 
 @login_required
+@use_replica
 def history(request):
     context = {
         "projects": Project.objects.filter(user=request.user, closed=True).order_by("-id")
@@ -492,50 +484,68 @@ def close_project(request, pk):
             log.error("Project already closed, skipping")
             return redirect(reverse('project', kwargs={"pk": project.pk}))
 
-        project.closed = True
-        project.save()
-
-        # Create pending score instances for each accepted coder and send mail to everyone
-        for offer in project.joboffer_set.filter():
-            if offer.accepted:
-                ProjectScore.objects.create(project_id=pk, coder=offer.user)
-
-            # Send mail to coder
-            html_message = loader.render_to_string(
-                'email/project_closed.html',
-                {
-                    'user_name': offer.user.username,
-                    'project': project,
-                    'scores_url': ProjectScore.get_url(),
-                    'accepted': offer.accepted
-                }
+        job_offers = list(project.joboffer_set.select_related('user'))
+        with transaction.atomic():
+            project.closed = True
+            project.save(update_fields=['closed'])
+            TechnologyCounter.update_counts(project.technologies.values_list('id', flat=True), -1)
+
+            # Create pending score instances for each accepted coder
+            coder_ids = [offer.user_id for offer in job_offers if offer.accepted]
+            ProjectScore.objects.bulk_create(ProjectScore(project_id=project.pk, coder_id=coder_id)
+                                             for coder_id in coder_ids)
+            ProjectScore.invalidate_num_pending_scores([project.user_id] + coder_ids)
+
+            # Queue mail to everyone in a single render pass
+            EmailManager.notify(
+                email_manager.PROJECT_CLOSED,
+                {'project': project, 'scores_url': ProjectScore.get_url()},
+                [(offer.user.email, {'user_name': offer.user.username, 'accepted': offer.accepted})
+                 for offer in job_offers]
             )
-            try:
-                send_mail(
-                    subject="Project {} closed!".format(project.title),
-                    message='',
-                    from_email='',
-                    recipient_list=(offer.user.email,),
-                    fail_silently=False,
-                    html_message=html_message
-                )
-            except Exception as e:
-                log.exception("Problem sending email: {}".format(e))
 
         return redirect(reverse('project', kwargs={"pk": project.pk}))
 
 
 def score_coder(request, pk):
-    score_object = ProjectScore.objects.get(pk=pk)
-    score_object.coder_score = request.POST.get('score')
-    score_object.save()
+    form = ScoreForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'Invalid form data')
+        return redirect(reverse('scores'))
+
+    with transaction.atomic():
+        score_object = ProjectScore.objects.select_for_update().select_related('coder', 'project').get(pk=pk)
+        score_object.set_coder_score(int(form.cleaned_data['score']))
     log.info("Owner {} rated Coder {}: {}".format(request.user, score_object.coder, score_object.coder_score))
     return redirect(reverse('scores'))
 
 
 def score_owner(request, pk):
-    score_object = ProjectScore.objects.get(pk=pk)
-    score_object.owner_score = request.POST.get('score')
-    score_object.save()
+    form = ScoreForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'Invalid form data')
+        return redirect(reverse('scores'))
+
+    with transaction.atomic():
+        score_object = ProjectScore.objects.select_for_update().select_related('project__user').get(pk=pk)
+        score_object.set_owner_score(int(form.cleaned_data['score']))
     log.info("Coder {} rated Owner {}: {}".format(request.user, score_object.project.user, score_object.owner_score))
     return redirect(reverse('scores'))
+
+
+@login_required
+def export(request, name, export_format):
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        log.error("Invalid export filters: {}".format(form.errors.as_json()))
+        return HttpResponseBadRequest()
+
+    filters = form.cleaned_data
+    # staff can export every owner, the rest only their own projects
+    if not request.user.is_staff:
+        if filters.get('owner') not in (None, request.user.pk):
+            return HttpResponseForbidden()
+        filters['owner'] = request.user.pk
+
+    log.info("User {} exporting {} as {} - Filters: {}".format(request.user, name, export_format, filters))
+    return stream_export(name, export_format, **filters)
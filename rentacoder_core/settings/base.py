@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -41,12 +43,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rentacoder_app.db_connections.ConnectionHealthMiddleware',
+    'rentacoder_app.replicas.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'rentacoder_app.throttling.ThrottleMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -85,6 +90,61 @@ DATABASES = {
     }
 }
 
+# Aliases of DATABASES replicating default, the views decorated with use_replica read from them
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['rentacoder_app.replicas.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# The portal fragments are versioned, every process must share the cache for the version to be global,
+# use a shared backend (file based, memcached, redis) when running more than one worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rentacoder',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/1.11/topics/http/sessions/#configuring-the-session-engine
+# RENTACODER_SESSION_MODE selects where the sessions are stored:
+#   cached_db       in the database, reads are served from the cache (shared by every worker)
+#   signed_cookies  in a signed cookie, requests do not touch the database to load the session,
+#                   a session can not be revoked on the server before it expires
+#   db              in the database, every request reads it
+SESSION_MODES = ('cached_db', 'signed_cookies', 'db')
+SESSION_MODE = os.environ.get('RENTACODER_SESSION_MODE', 'cached_db')
+if SESSION_MODE not in SESSION_MODES:
+    raise ImproperlyConfigured('RENTACODER_SESSION_MODE must be one of {}'.format(', '.join(SESSION_MODES)))
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_MODE
+# signed cookies are only safe with the JSON serializer, it is also the default
+SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
+
+# Messages are kept in their own cookie, falling back to the session when they do not fit. With signed
+# cookie sessions the fallback would grow the session cookie, so they are only stored in the messages cookie
+if SESSION_MODE == 'signed_cookies':
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+else:
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+
+# Throttling
+# POST requests allowed to each view as (burst size, seconds to refill it), counted per client address
+# and per user. THROTTLE_BACKEND 'local' keeps the counters in each worker, 'cache' shares them through
+# the default cache so the limits hold across workers
+THROTTLE_BACKEND = 'local'
+THROTTLE_RATES = {
+    'register': (5, 3600),
+    'reset_password_post': (5, 3600),
+    'reset_password_get': (10, 3600),
+    'apply': (30, 3600),
+}
+# only enable behind a proxy that sets X-Forwarded-For
+THROTTLE_TRUST_FORWARDED_FOR = False
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -165,6 +225,12 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Files collected by the build_static command, with hashed names, a manifest and precompressed variants
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Serve STATIC_ROOT from Django picking the precompressed variants, for deployments where the front
+# web server does not serve it. Not needed with runserver and DEBUG, it serves STATICFILES_DIRS
+SERVE_STATIC = False
+
 # Specify the custom user model which django is going to use
 AUTH_USER_MODEL = 'rentacoder_app.User'
 
@@ -173,6 +239,17 @@ MEDIA_FOLDER = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, MEDIA_FOLDER)
 MEDIA_URL = '/media/'
 
+# Attachment downloads
+# Access is checked by Django, ATTACHMENT_SENDFILE hands the transfer to the front web server:
+#   None                Django streams the file in chunks
+#   'x-sendfile'        Apache mod_xsendfile or lighttpd, the header has the absolute file path
+#   'x-accel-redirect'  nginx, the header has ATTACHMENT_ACCEL_PREFIX followed by the path inside MEDIA_ROOT,
+#                       map it to MEDIA_ROOT with an 'internal' location so it can not be requested directly
+# The attachments live in the blobs and files folders of MEDIA_ROOT, the web server must not serve
+# those folders under MEDIA_URL
+ATTACHMENT_SENDFILE = None
+ATTACHMENT_ACCEL_PREFIX = '/protected-media/'
+
 # Email manager configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'localhost'
@@ -13,5 +13,53 @@ DATABASES = {
         'PORT': '5432',
         'USER': 'djangodemo',
         'PASSWORD': 'djangodemo',
+        # keep the connections open between requests, ConnectionHealthMiddleware checks the idle ones
+        'CONN_MAX_AGE': int(os.environ.get('RENTACODER_DB_CONN_MAX_AGE', 600)),
     }
-}
\ No newline at end of file
+}
+
+# RENTACODER_DB_POOLING selects how the workers reach postgresql:
+#   persistent  each worker keeps its own connection to postgresql for CONN_MAX_AGE seconds
+#   pgbouncer   through pgbouncer in transaction pooling mode, the server connection can change between
+#               transactions so nothing may rely on session state. pgbouncer must set the server
+#               connections to the TIME_ZONE of the settings, django only sets it when it differs
+DB_POOLING_MODES = ('persistent', 'pgbouncer')
+DB_POOLING = os.environ.get('RENTACODER_DB_POOLING', 'persistent')
+if DB_POOLING not in DB_POOLING_MODES:
+    raise ImproperlyConfigured('RENTACODER_DB_POOLING must be one of {}'.format(', '.join(DB_POOLING_MODES)))
+if DB_POOLING == 'pgbouncer':
+    DATABASES['default'].update({
+        'PORT': os.environ.get('RENTACODER_PGBOUNCER_PORT', '6432'),
+        # named cursors only live inside the transaction that declared them, so iterator() becomes
+        # a full fetch of the rows. Code streaming large querysets must read them in chunks of ids
+        # instead, as export.keyset_rows does
+        'DISABLE_SERVER_SIDE_CURSORS': True,
+    })
+
+# comma separated hosts of the streaming replicas, reached with the same credentials and port as default
+for number, host in enumerate(filter(None, os.environ.get('RENTACODER_DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/rentacoder_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# run the resize_avatars command on every deploy after migrate, new users show the variants of the default avatar
+
+# run the build_static command on every deploy, templates resolve the hashed names from its manifest
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+SERVE_STATIC = True
+
+# enable once nginx has the internal ATTACHMENT_ACCEL_PREFIX location
+# ATTACHMENT_SENDFILE = 'x-accel-redirect'
+
+# the file based cache is shared by every worker
+THROTTLE_BACKEND = 'cache'
@@ -0,0 +1,9 @@
+from .development import *
+
+# a second sqlite file stands in for a replica, nothing copies the rows so the tests can tell
+# which database a query read from. Run the tests with --settings=rentacoder_core.settings.testing
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+}
+DATABASE_REPLICAS = ['replica']
@@ -13,12 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.conf.urls import url, include
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
-from rentacoder_app import views
+from rentacoder_app import static_serving, views
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^', include('rentacoder_app.urls')),
 ]
+
+if settings.SERVE_STATIC:
+    urlpatterns.insert(0, url(r'^{}(?P<path>.*)$'.format(settings.STATIC_URL.lstrip('/')), static_serving.serve))
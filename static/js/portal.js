@@ -1,3 +1,7 @@
 $(".heart.fa").click(function() {
   $(this).toggleClass("fa-heart fa-heart-o");
-});
\ No newline at end of file
+});
+// keep the technology filter open while checking technologies
+$(".technology-filter").click(function(event) {
+  event.stopPropagation();
+});